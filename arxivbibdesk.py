@@ -26,14 +26,19 @@ Input may be one of the following:
 - arXiv abstract page
 - arXiv identifier
 """
+import bibtexbibdesk
 import cdsbibdesk
+import httpbibdesk
+import identbibdesk
 
 import datetime
 import difflib
 import fnmatch
 import glob
+import heapq
+import httplib
+import json
 import logging
-import math
 import optparse
 import os
 import pprint
@@ -41,11 +46,13 @@ import re
 import socket
 import sys
 import tempfile
+import threading
 import time
 
 # cgi.parse_qs is deprecated since 2.6
 # but OS X 10.5 only has 2.5
 import cgi
+import urllib
 import urllib2
 import urlparse
 
@@ -132,6 +139,11 @@ updated if it has a new bibcode."""
         '-w', '--overwrite',
         default=False, action="store_true",
         help="Do not check title similarity to decide if the paper is new in the database")
+    parser.add_option(
+        '-j', '--jobs',
+        type='int', default=None,
+        help="Number of articles fetched concurrently"
+             " (default: jobs in ~/.adsbibdesk)")
     parser.add_option(
         '-o', '--only_pdf',
         default=False, action='store_true',
@@ -195,6 +207,18 @@ updated if it has a new bibcode."""
     logging.debug("ADS to BibDesk version %s" % VERSION)
     logging.debug("Python: %s", sys.version)
 
+    # on-disk cache for arXiv, Inspire and CDS API responses
+    if prefs['cache_path'] and prefs['cache_size']:
+        httpbibdesk.install_cache(os.path.expanduser(prefs['cache_path']),
+                                  prefs['cache_ttl'] or 0,
+                                  prefs['cache_size'] * 2 ** 20)
+    # concurrent connections per host, when fetching with several jobs
+    httpbibdesk.pool.max_per_host = prefs['max_connections_per_host']
+    # per-host request rate limits, shared by every fetcher
+    httpbibdesk.install_rate_limiter(
+        prefs['rate_limit'] or 0, prefs['rate_burst'] or 1,
+        httpbibdesk.parse_host_rates(prefs['host_rate_limits']))
+
     # Launch the specific workflow
     if options.ingest_pdfs:
         ingest_pdfs(options, args, prefs)
@@ -209,7 +233,7 @@ updated if it has a new bibcode."""
         process_articles(args, prefs)
 
 
-def process_articles(args, prefs, delay=15):
+def process_articles(args, prefs):
     """Workflow for processing article tokens and running process_token()
     to add the article to BibDesk.
     """
@@ -224,19 +248,79 @@ def process_articles(args, prefs, delay=15):
     # AppKit hook for BibDesk
     bibdesk = BibDesk()
 
-    for article_token in article_tokens:
+    # nothing to fetch for papers already in the library
+    article_tokens = [article_token for article_token in article_tokens
+                      if not known_token(article_token, prefs, bibdesk)]
+
+    # resolve all arXiv and CERN report tokens upfront, a chunk of IDs per
+    # API request
+    classified = map(classify_token, article_tokens)
+    arxiv_ids = [ident for kind, ident in classified if kind == 'arxiv']
+    reports = [ident for kind, ident in classified if kind == 'report']
+    batch_bibs = {}
+    if len(arxiv_ids) > 1:
+        logging.info('Resolving %i arXiv IDs...' % len(arxiv_ids))
+        batch_bibs.update(
+            resolve_arxiv_batch(arxiv_ids, prefs['arxiv_batch_size']))
+    if len(reports) > 1:
+        logging.info('Resolving %i CDS report numbers...' % len(reports))
+        batch_bibs.update(cdsbibdesk.resolve_reports_batch(
+            reports, prefs['cds_batch_size']))
+
+    jobs = prefs['options'].get('jobs') or prefs['jobs'] or 1
+    if jobs > 1 and len(article_tokens) > 1:
+        # fetch metadata and PDFs concurrently, import into BibDesk serially
+        logging.debug('fetching with %i concurrent jobs' % jobs)
+        for article_token, fetched in pipeline_tokens(
+                article_tokens, prefs, jobs, batch_bibs):
+            if not fetched:
+                continue
+            try:
+                import_token(article_token, prefs, bibdesk, *fetched)
+            except ADSException, err:
+                logging.debug('%s failed - %s' % (article_token, err))
+    else:
+        for article_token in article_tokens:
+            try:
+                process_token(article_token, prefs, bibdesk, batch_bibs)
+            except ADSException, err:
+                logging.debug('%s failed - %s' % (article_token, err))
+
+    bibdesk.close()
+
+
+def pipeline_tokens(article_tokens, prefs, jobs, batch_bibs=None):
+    """Run fetch_token() on many tokens with a pool of `jobs` threads.
+
+    Per-host concurrency is bounded by the shared HTTP connection pool.
+    Notifications raised by the workers are posted from the calling thread.
+
+    :return: generator of (article_token, fetch_token() result) tuples, in
+        order of completion; the result is None for tokens that failed
+    """
+    from multiprocessing.pool import ThreadPool
+
+    def fetch(article_token):
+        # any error is the token's own, and must not end the whole batch
         try:
-            process_token(article_token, prefs, bibdesk)
-        except ADSException, err:
-            logging.debug('%s failed - %s' % (article_token, err))
-        if len(article_tokens) > 1 and article_token != article_tokens[-1]:
-            time.sleep(delay)
+            return article_token, fetch_token(article_token, prefs, batch_bibs)
+        except Exception, err:
+            logging.debug('%s failed - %s' % (article_token, err),
+                          exc_info=not isinstance(err, ADSException))
+            return article_token, None
 
-    bibdesk.app.dealloc()
+    workers = ThreadPool(jobs)
+    try:
+        for result in workers.imap_unordered(fetch, article_tokens):
+            flush_notifications()
+            yield result
+    finally:
+        workers.terminate()
+    flush_notifications()
 
 
 # FIXME this function needs to be refactored
-def process_token(article_token, prefs, bibdesk):
+def process_token(article_token, prefs, bibdesk, batch_bibs=None):
     """Process a single article token from the user, adding it to BibDesk.
 
     Parameters
@@ -247,21 +331,88 @@ def process_token(article_token, prefs, bibdesk):
         A `Preferences` instance.
     bibdesk : :class:`BibDesk`
         A `BibDesk` AppKit hook instance.
+    batch_bibs : dict
+        Optional arXiv ID -> :class:`ArXivParser` and upper case CERN
+        report number -> :class:`cdsbibdesk.CDSParser`, already resolved by
+        `resolve_arxiv_batch` and `cdsbibdesk.resolve_reports_batch`.
+    """
+    if known_token(article_token, prefs, bibdesk):
+        return False
+    fetched = fetch_token(article_token, prefs, batch_bibs)
+    if not fetched:
+        return False
+    ads_parser, pdf = fetched
+
+    # TODO refactor this out into a 'show_pdf' function
+    if prefs['options'].get('only_pdf'):
+        if not pdf.endswith('.pdf'):
+            return False
+        # just open PDF
+        reader = ('pdf_reader' in prefs and
+                  prefs['pdf_reader'] is not None) and \
+            prefs['pdf_reader'] or 'Finder'
+        app = AppKit.NSAppleScript.alloc()
+        app.initWithSource_(
+            'tell application "%s" '
+            'to open ("%s" as POSIX file)' % (reader, pdf)).\
+            executeAndReturnError_(None)
+        # get name of the used viewer
+        # (Finder may be defaulted to something else than Preview)
+        if reader == 'Finder':
+            reader = app.initWithSource_(
+                'return name of (info for (path to frontmost application))').\
+                executeAndReturnError_(None)[0].stringValue()
+        logging.debug('opening %s with %s' % (pdf, reader))
+        if 'skim' in reader.lower():
+            time.sleep(1)  # give it time to open
+            app.initWithSource_(
+                'tell application "%s" to set view settings '
+                'of first document to {auto scales:true}'
+                % reader).executeAndReturnError_(None)
+        app.dealloc()
+        return True
+
+    import_token(article_token, prefs, bibdesk, ads_parser, pdf)
+
+
+def known_token(article_token, prefs, bibdesk):
+    """
+    Check the identifier of `article_token` against the BibDesk library,
+    before anything is fetched
+
+    :return: True if the publication is already there and is not to be
+        overwritten; always False when only the PDF is wanted
+    """
+    options = prefs['options']
+    if bibdesk is None or options.get('overwrite') or \
+            options.get('only_pdf'):
+        return False
+    pid = bibdesk.snapshot.identifier_index.find(article_token)
+    if pid is None:
+        return False
+    logging.info('%s is already in BibDesk, skipping' % article_token)
+    notify('Already in BibDesk', article_token, 'Nothing to fetch')
+    return True
+
+
+def fetch_token(article_token, prefs, batch_bibs=None):
+    """Network stage of process_token(): resolve the token metadata and
+    download its PDF. Does not touch BibDesk, so it can run in a worker
+    thread.
+
+    :return: (ads_parser, pdf) tuple, or False if the token was skipped
     """
     # Determine what we're dealing with
     # The goal is to get a URL into ADS
     logging.debug("process_token found article token %s", article_token)
-    connector = ADSConnector(article_token, prefs)
+    connector = ADSConnector(article_token, prefs, batch_bibs)
     # ADSConnector will take care of the cases in which is arXiv instead of ADS
     # at the end it will generate a connector.bib with the bibtex info
     ads_parser = ADSHTMLParser(prefs=prefs)
-    #overwrite=prefs['overwrite']
-    overwrite=prefs['options']['overwrite']
-    citekey=prefs['options']['citekey']
-    print_bibtex=prefs['options']['fetch_bibtex']
     # print 'connector.ads_read', connector.ads_read
 
-    if isinstance(connector.ads_read, basestring):
+    if isinstance(connector.ads_read, basestring) \
+            or hasattr(connector.ads_read, 'read'):
         # parse the ADS HTML file
         # print 'HTML from ADS'
         #logging.debug('usr: %s', connector.ads_read)
@@ -274,14 +425,15 @@ def process_token(article_token, prefs, bibdesk):
         ads_parser.bibtex = connector.bibtex
         ads_parser.arxivid = ads_parser.bibtex.Eprint
         ads_parser.author = ads_parser.bibtex.Author.split(' and ')
-        ads_parser.title = ads_parser.bibtex.Title
-        ads_parser.abstract = ads_parser.bibtex.Abstract
+        # records may lack a title or abstract
+        ads_parser.title = ads_parser.bibtex.Title or ''
+        ads_parser.abstract = ads_parser.bibtex.Abstract or ''
         ads_parser.comment = ads_parser.bibtex.AdsComment
         # original URL where we *should* have gotten the info
         ads_parser.bibtex.AdsURL = connector.ads_url
         #ads_parser.pdf_link = connector.pdf_link
         # inject arXiv mirror into ArXivURL
-        if 'arxiv_mirror' in prefs and prefs['arxiv_mirror']:
+        if prefs['arxiv_mirror'] not in (None, 'auto'):
             tmpurl = urlparse.urlsplit(ads_parser.bibtex.ArXivURL)
             ads_parser.bibtex.ArXivURL = urlparse.urlunsplit(
                 (tmpurl.scheme,
@@ -290,12 +442,16 @@ def process_token(article_token, prefs, bibdesk):
                  tmpurl.fragment))
         # link for PDF download
         print ads_parser.bibtex.info['link']
+        link = ads_parser.bibtex.info['link']
         try:
-            if "http:" in ads_parser.bibtex.info['link']:
-
-                ads_parser.links = {'confnote': ads_parser.bibtex.info['link']}
+            # CDS and Inspire give the PDF URL (http or https), arXiv gives
+            # the list of links of its Atom entry
+            if isinstance(link, basestring):
+                if not link:
+                    raise IndexError
+                ads_parser.links = {'confnote': link}
             else:
-                link = [l.get('href', '') for l in ads_parser.bibtex.info['link']
+                link = [l.get('href', '') for l in link
                         if l.get('title') == 'pdf'][0]
                 ads_parser.links = {'preprint': link}
         except IndexError:
@@ -309,35 +465,19 @@ def process_token(article_token, prefs, bibdesk):
 
     # get PDF first
     pdf = ads_parser.get_pdf()
+    return ads_parser, pdf
 
-    # TODO refactor this out into a 'show_pdf' function
-    if prefs['options'].get('only_pdf'):
-        if not pdf.endswith('.pdf'):
-            return False
-        # just open PDF
-        reader = ('pdf_reader' in prefs and
-                  prefs['pdf_reader'] is not None) and \
-            prefs['pdf_reader'] or 'Finder'
-        app = AppKit.NSAppleScript.alloc()
-        app.initWithSource_(
-            'tell application "%s" '
-            'to open ("%s" as POSIX file)' % (reader, pdf)).\
-            executeAndReturnError_(None)
-        # get name of the used viewer
-        # (Finder may be defaulted to something else than Preview)
-        if reader == 'Finder':
-            reader = app.initWithSource_(
-                'return name of (info for (path to frontmost application))').\
-                executeAndReturnError_(None)[0].stringValue()
-        logging.debug('opening %s with %s' % (pdf, reader))
-        if 'skim' in reader.lower():
-            time.sleep(1)  # give it time to open
-            app.initWithSource_(
-                'tell application "%s" to set view settings '
-                'of first document to {auto scales:true}'
-                % reader).executeAndReturnError_(None)
-        app.dealloc()
-        return True
+
+def import_token(article_token, prefs, bibdesk, ads_parser, pdf):
+    """BibDesk stage of process_token(): add the publication fetched by
+    fetch_token(), replacing a duplicate when overwriting.
+
+    Must run in the main thread, AppleScript calls are not thread safe.
+    """
+    #overwrite=prefs['overwrite']
+    overwrite=prefs['options']['overwrite']
+    citekey=prefs['options']['citekey']
+    print_bibtex=prefs['options']['fetch_bibtex']
 
     # search for already existing publication
     # with exactly the same title and first author
@@ -347,9 +487,10 @@ def process_token(article_token, prefs, bibdesk):
 
     print 'Check for duplicates'
 
-    found = difflib.get_close_matches(
-        ads_parser.title, bibdesk.titles,
-        n=1, cutoff=.9)
+    found = bibdesk.snapshot.title_index.get_close_matches(
+        ads_parser.title, n=1, cutoff=.9)
+    # the publication with that title, by the same first author if several
+    pid = found and bibdesk.pid(found[0], (ads_parser.author or [None])[0])
     kept_pdfs = []
     kept_fields = {}
     # first author is the same
@@ -362,14 +503,13 @@ def process_token(article_token, prefs, bibdesk):
             notify("Will do nothing!","","")
     if overwrite and len(found)>0 and difflib.SequenceMatcher(
             None,
-            bibdesk.authors(bibdesk.pid(found[0]))[0],
+            bibdesk.authors(pid)[0],
             ads_parser.author[0]).ratio() > .1:
         # further comparison on abstract
-        abstract = bibdesk('abstract', bibdesk.pid(found[0])).stringValue()
+        abstract = bibdesk('abstract', pid).stringValue()
         if not abstract or difflib.SequenceMatcher(
                 None, abstract,
                 ads_parser.abstract).ratio() > .6:
-            pid = bibdesk.pid(found[0])
             # keep all fields for later comparison
             # (especially rating + read bool)
             kept_fields = dict((k, v) for k, v in
@@ -383,10 +523,9 @@ def process_token(article_token, prefs, bibdesk):
             kept_pdfs += bibdesk.safe_delete(pid)
             notify('Duplicate publication removed',
                    article_token, ads_parser.title)
-            bibdesk.refresh()
     else:
         if len(found)>0:
-            print("Warning: authors are similar", ads_parser.author[0],bibdesk.authors(bibdesk.pid(found[0]))[0])
+            print("Warning: authors are similar", ads_parser.author[0],bibdesk.authors(pid)[0])
 
     # FIXME refactor out this bibdesk import code?
     if overwrite or len(found)==0:
@@ -406,78 +545,84 @@ def process_token(article_token, prefs, bibdesk):
             # ads_parser.bibtex.bib already contains the bibtex string
             # this is the case for papers imported from arXiv API (because the API gives no bibtex)
 
-            pub = bibdesk(
-                'import from "%s"' % ads_parser.bibtex.bib.
-                replace('\\', r'\\').replace('"', r'\"'))
+            bib = ads_parser.bibtex.bib
 
         else:
             # the bibtex string needs to be made from the data in the ads_parser.bibtex
             # this needs to be able to tell if the item has to get a link to inspires or CDS
 
 
-            _string = 'import from "%s"' % ads_parser.bibtex.__str__().\
-            replace('\\', r'\\').replace('"', r'\"')
-            logging.debug('Tell Bibdesk %s' % _string)
-            pub = bibdesk(_string)
+            bib = ads_parser.bibtex.__str__()
+            logging.debug('Tell Bibdesk import from %s' % bib)
+        pub = bibdesk('import from %s', args=[bib])
 
         # pub id
         pub = pub.descriptorAtIndex_(1).descriptorAtIndex_(3).stringValue()
         print pub
         logging.debug('using automatic cite-key %s' % pub)
+
+        # the rest goes in two scripts: what can be set right away, and
+        # what depends on the fields that result from it
+        batch = bibdesk.batch(pub)
         if citekey:
             # automatic cite key (following the auto-file format!)
-            bibdesk('set cite key to generated cite key', pub)
+            batch('set cite key to generated cite key')
 
         # abstract
         if ads_parser.abstract.startswith('http://'):
             # old scanned articles
-            bibdesk(
-                'make new linked URL at end of linked URLs '
-                'with data "%s"' % ads_parser.abstract, pub)
+            batch('make new linked URL at end of linked URLs with data %s',
+                  ads_parser.abstract)
         else:
-            bibdesk(
-                'set abstract to "%s"'
-                % ads_parser.abstract.replace('\\', r'\\').replace('"', r'\"'),
-                pub)
+            batch('set abstract to %s', ads_parser.abstract)
 
-        doi = bibdesk('value of field "doi"', pub).stringValue()
         if pdf.endswith('.pdf'):
             # register PDF into BibDesk
-            bibdesk('add POSIX file "%s" to beginning of linked files' % pdf, pub)
+            batch('add POSIX file %s to beginning of linked files', pdf)
             # automatic file name
-            bibdesk('auto file', pub)
-        elif 'http' in pdf and not doi:
-            # URL for electronic version - only add it if no DOI link present
-            # (they are very probably the same)
-            bibdesk(
-                'make new linked URL at end of linked URLs with data "%s"'
-                % pdf, pub)
-
-        # add URLs as linked URL if not there yet
-        urls = bibdesk(
-            'value of fields whose name ends with "url"',
-            pub, strlist=True)
-        urlspub = bibdesk('linked URLs', pub, strlist=True)
-        for u in [u for u in urls if u not in urlspub]:
-            bibdesk(
-                'make new linked URL at end of linked URLs with data "%s"'
-                % u, pub)
+            batch('auto file')
 
         # add old annotated files
         for kept_pdf in kept_pdfs:
-            bibdesk('add POSIX file "%s" to end of linked files' % kept_pdf, pub)
+            batch('add POSIX file %s to end of linked files', kept_pdf)
 
         # re-insert custom fields
-        bibdesk(
-            'set its note to "%s"' % kept_fields.pop('BibDeskAnnotation', ''),
-            pub)
-        newFields = bibdesk('return name of fields', pub, True)
+        batch('set its note to %s', kept_fields.pop('BibDeskAnnotation', ''))
+
+        result = batch.run('{%s, value of fields whose name ends with "url", '
+                           'linked URLs, name of fields, cite key}'
+                           % bibdesk.snapshot_query())
+        if result is not None:
+            values, (urls, urlspub, newFields, cite_key) = \
+                result[:-4], result[-4:]
+            bibdesk.indexed(pub, values)
+        else:
+            # query each value on its own
+            bibdesk.indexed(pub)
+            urls = bibdesk('return value of fields whose name ends with "url"',
+                           pub, strlist=True)
+            urlspub = bibdesk('return linked URLs', pub, strlist=True)
+            newFields = bibdesk('return name of fields', pub, True)
+            cite_key = bibdesk('return cite key', pub).stringValue()
+        doi = bibdesk.snapshot.records[pub].get('doi')
+
+        if not pdf.endswith('.pdf') and 'http' in pdf and not doi:
+            # URL for electronic version - only add it if no DOI link present
+            # (they are very probably the same)
+            batch('make new linked URL at end of linked URLs with data %s',
+                  pdf)
+            urlspub = urlspub + [pdf]
+
+        # add URLs as linked URL if not there yet
+        for u in [u for u in urls if u and u not in urlspub]:
+            batch('make new linked URL at end of linked URLs with data %s',
+                  u)
+
         for k, v in kept_fields.iteritems():
             if k not in newFields:
-                bibdesk('set value of field "%s" to "%s"' % (k, v), pub)
-        notify('New publication added',
-               bibdesk('cite key', pub).stringValue(),
-               ads_parser.title)
+                batch('set value of field %s to %s', k, v)
+        batch.run()
+        notify('New publication added', cite_key, ads_parser.title)
 
 
 def ingest_pdfs(options, args, prefs):
@@ -534,11 +679,15 @@ def update_arxiv(options, prefs):
         re.match('^\d{2}/\d{2}$', options.to_date) is not None, \
         '--to_date needs to be in MM/YY format'
 
-    def b2d(bibtex):
-        """BibTex -> publication date"""
-        m = re.search('Month = \{?(\w*)\}?', bibtex).group(1)
-        y = re.search('Year = \{?(\d{4})\}?', bibtex).group(1)
-        return datetime.datetime.strptime(m + y, '%b%Y')
+    def b2d(entry):
+        """BibTeX entry -> publication date"""
+        return datetime.datetime.strptime(
+            entry.get('month', '')[:3] + entry.get('year', ''), '%b%Y')
+
+    def is_arxiv(adsurl):
+        # same test as the AppleScript "contains", case insensitive
+        adsurl = adsurl.lower()
+        return 'arxiv' in adsurl or 'astro.ph' in adsurl
 
     def recent(added, fdate, tdate):
         fromdate = fdate is not None and \
@@ -552,22 +701,33 @@ def update_arxiv(options, prefs):
     # frontmost opened BibDesk document
     bibdesk = BibDesk()
     ids = []
+    library = bibdesk.library_path()
+
+    if library is not None:
+        # stream the saved .bib file, much faster than AppleScript
+        for entry in bibtexbibdesk.iterread(
+                library, fields=('adsurl', 'month', 'year')):
+            adsurl = entry.get('adsurl')
+            if adsurl and is_arxiv(adsurl) and \
+                    recent(b2d(entry), options.from_date, options.to_date):
+                ids.append(identbibdesk.ads_query(adsurl))
+        arxiv = None
+    else:
+        # check for adsurl containing arxiv or astro.ph bibcodes
+        arxiv = bibdesk(
+            'return publications whose '
+            '(value of field "Adsurl" contains "arXiv") or '
+            '(value of field "Adsurl" contains "astro.ph")')
 
-    # check for adsurl containing arxiv or astro.ph bibcodes
-    arxiv = bibdesk(
-        'return publications whose '
-        '(value of field "Adsurl" contains "arXiv") or '
-        '(value of field "Adsurl" contains "astro.ph")')
-
-    if arxiv.numberOfItems():
+    if arxiv is not None and arxiv.numberOfItems():
         # extract arxiv id from the ADS url
-        ids = [u.split('bib_query?')[-1].split('abs/')[-1] for u in
+        ids = [identbibdesk.ads_query(u) for u in
                bibdesk(
                    'tell publications whose '
                    '(value of field "Adsurl" contains "arXiv") or '
                    '(value of field "Adsurl" contains "astro.ph") '
                    'to return value of field "Adsurl"', strlist=True)]
-        dates = [b2d(b) for b in
+        dates = [b2d(bibtexbibdesk.parse_entry(b)) for b in
                  bibdesk(
                      'tell publications whose '
                      '(value of field "Adsurl" contains "arXiv") or '
@@ -577,31 +737,21 @@ def update_arxiv(options, prefs):
         ids = [b for d, b in zip(dates, ids)
                if recent(d, options.from_date, options.to_date)]
 
-    bibdesk.app.dealloc()
+    bibdesk.close()
 
     if not ids:
         print 'Nothing to update!'
         sys.exit()
     else:
-        n = len(ids)
-        t = math.ceil(n * 15. / 60.)
-        if t > 1:
-            time_unit = "minutes"
-        else:
-            time_unit = "minute"
-        logging.info('Checking %i arXiv entries for changes...' % n)
-        logging.info(
-            '(to prevent ADS flooding this will take a while, '
-            'check back in around %i %s)' % (t, time_unit))
+        logging.info('Checking %i arXiv entries for changes...' % len(ids))
 
     changed = []
     for n, i in enumerate(ids):
-        # sleep for 15 seconds, to prevent ADS flooding
-        time.sleep(15)
+        # ADS flooding is prevented by the per-host rate limiter
         logging.debug("arxiv id %s" % i)
         # these are ADS bibcodes by default
         adsURL = urlparse.urlunsplit(
-            ('http', prefs['ads_mirror'],
+            ('http', get_mirror(prefs, 'ads'),
              'cgi-bin/bib_query', i, ''))
         logging.debug("adsURL %s" % adsURL)
         # parse the ADS HTML file
@@ -628,20 +778,27 @@ def update_arxiv(options, prefs):
     if changed and raw_input(
             'Updating %i entries, continue? (y/[n]) '
             % len(changed)) in ('Y', 'y'):
-        logging.info(
-            '(to prevent ADS flooding, we will wait for a while '
-            'between each update, so go grab a coffee)')
         process_articles(changed, prefs)
     elif not changed:
         logging.info('Nothing to update!')
 
 
+# notifications raised in worker threads, see flush_notifications()
+_pending_notifications = []
+
+
 def notify(title, subtitle, desc, sticky=False):
     """Publish a notification to Notification Center
 
     Adaptation of original by Moises Aranas
     https://github.com/maranas/pyNotificationCenter
+
+    Outside the main thread the notification is queued, and posted by the
+    next flush_notifications() call.
     """
+    if threading.current_thread().name != 'MainThread':
+        _pending_notifications.append((title, subtitle, desc, sticky))
+        return
     try:
         import objc
         notification = objc.lookUpClass('NSUserNotification').alloc().init()
@@ -659,6 +816,12 @@ def notify(title, subtitle, desc, sticky=False):
         growl_notify(title, desc, sticky)
 
 
+def flush_notifications():
+    """Post the notifications queued by worker threads"""
+    while _pending_notifications:
+        notify(*_pending_notifications.pop(0))
+
+
 def growl_notify(title, desc, sticky=False):
     title = title.replace('"', r'\"')
     desc = desc.replace('"', r'\"')
@@ -699,18 +862,30 @@ def has_annotationss(f):
 def get_redirect(url):
     """Utility function to intercept final URL of HTTP redirection"""
     try:
-        out = urllib2.urlopen(url)
+        out = httpbibdesk.urlopen(url)
+        # only the final URL is needed, drop the body
+        out.close()
     except urllib2.URLError, out:
         pass
     return out.geturl()
 
 
+def classify_token(token):
+    """Classify an article token from its syntax alone, without touching
+    the network.
+
+    :return: a ``(kind, identifier)`` tuple, where kind is one of 'arxiv',
+        'doi', 'bibcode', 'report' or 'recid' and identifier is the bare ID
+        stripped of URL or scheme prefixes; ``(None, token)`` when the token
+        is not recognised. See `identbibdesk.classify()`.
+    """
+    return identbibdesk.classify(token)
+
+
 class PDFDOIGrabber(object):
     """Converts PDFs to text and attempts to match all DOIs"""
     def __init__(self):
         super(PDFDOIGrabber, self).__init__()
-        regstr = r'(10[.][0-9]{4,}(?:[.][0-9]+)*/(?:(?!["&\'<>\)\.,])\S)+)'
-        self.pattern = re.compile(regstr)
 
     def search(self, pdfPath):
         """Return a list of DOIs in the text of the PDF at `pdfPath`"""
@@ -719,7 +894,7 @@ class PDFDOIGrabber(object):
             os.remove(json_path)
         sp.call('pdf2json -q "%s" "%s"' % (pdfPath, json_path), shell=True)
         data = open(json_path, 'r').read()
-        doi_matches = self.pattern.findall(data)
+        doi_matches = identbibdesk.find_dois(data)
         if os.path.exists(json_path):
             os.remove(json_path)
 
@@ -729,16 +904,305 @@ class PDFDOIGrabber(object):
                 "strings %s" % pdfPath,
                 shell=True, stdout=sp.PIPE,
                 stderr=open('/dev/null', 'w')).stdout.read()
-            doi_matches = self.pattern.findall(data)
+            doi_matches = identbibdesk.find_dois(data)
+
+        return doi_matches
+
+
+class NegativeCache(object):
+    """Persistent record of identifier probes that came back empty.
+
+    Misses are keyed by probe name and canonical token key (see
+    `identbibdesk.key()`), so that all spellings of an identifier share
+    them, stored as a JSON
+    dict of timestamps in `path`, and forgotten after `ttl` seconds.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.misses = json.load(f)
+        except (IOError, ValueError):
+            self.misses = {}
+        now = time.time()
+        self.misses = dict((k, t) for k, t in self.misses.iteritems()
+                           if now - t < ttl)
+
+    def _key(self, probe, token):
+        return '%s:%s' % (probe, identbibdesk.key(token))
+
+    def missed(self, probe, token):
+        """:return: True if `probe` already failed for `token`"""
+        stamp = self.misses.get(self._key(probe, token))
+        return stamp is not None and time.time() - stamp < self.ttl
+
+    def add(self, probe, token):
+        """Remember that `probe` failed for `token`"""
+        with self._lock:
+            self.misses[self._key(probe, token)] = time.time()
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.misses, f)
+            os.rename(tmp, self.path)
+
+
+# NegativeCache instances shared by all ADSConnectors, by path
+_negative_caches = {}
+_negative_caches_lock = threading.Lock()
+
+
+def negative_cache(prefs):
+    """:return: the `NegativeCache` configured in `prefs`, or None if
+    disabled"""
+    path = prefs['negative_cache_path']
+    if not path or not prefs['negative_cache_ttl']:
+        return None
+    path = os.path.expanduser(path)
+    with _negative_caches_lock:
+        if path not in _negative_caches:
+            _negative_caches[path] = NegativeCache(
+                path, prefs['negative_cache_ttl'])
+        return _negative_caches[path]
+
+
+# known mirrors, see MirrorRanking
+ADS_MIRRORS = ['adsabs.harvard.edu',
+               'cdsads.u-strasbg.fr',
+               'ukads.nottingham.ac.uk',
+               'esoads.eso.org',
+               'ads.ari.uni-heidelberg.de',
+               'ads.inasan.ru',
+               'ads.mao.kiev.ua',
+               'ads.astro.puc.cl',
+               'ads.on.br',
+               'ads.nao.ac.jp',
+               'ads.bao.ac.cn',
+               'ads.iucaa.ernet.in',
+               'www.ads.lipi.go.id']
+# arXiv retired its mirrors, which now redirect to arxiv.org, and
+# export.arxiv.org is meant for the API only
+ARXIV_MIRRORS = ['arxiv.org']
+# page each mirror is probed with, as requested by ADSConnector and
+# ADSHTMLParser (ATLAS Higgs discovery paper)
+MIRROR_PROBE_URLS = {'ads': 'http://%s/abs/2012PhLB..716....1A',
+                     'arxiv': 'http://%s/abs/1207.7214'}
+
+
+class MirrorRanking(object):
+    """Ranks mirrors by measured latency and success rate.
+
+    Each mirror is probed with a HEAD request of the `probe_urls` page of
+    its kind, which succeeds only on a 2xx response, following redirects
+    within the same host, so that a host that merely redirects elsewhere
+    is not ranked first; latency and health (the fraction of successful
+    requests) are kept as moving averages in a JSON file at `path`.
+    Mirrors are probed in a background thread, when first needed and then
+    whenever their ranking is older than `ttl` seconds or its best mirror
+    starts failing.
+    """
 
-        return list(set(doi_matches))
+    # seconds before a probe is counted as a failure
+    probe_timeout = 5
+    # weight of the latest measurement in the moving averages
+    smoothing = 0.3
+    # mirrors below this health are only used as a last resort
+    min_health = 0.5
+
+    def __init__(self, path, ttl, mirrors, probe_urls):
+        self.path = path
+        self.ttl = ttl
+        self.mirrors = mirrors  # kind -> list of hosts
+        self.probe_urls = probe_urls  # kind -> URL template of the host
+        self._lock = threading.Lock()
+        self._probing = set()
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            self.probed = state['probed']
+            self.stats = state['stats']
+        except (IOError, ValueError, KeyError, TypeError):
+            self.probed = {}
+            self.stats = {}
+
+    def ranked(self, kind):
+        """:return: the `kind` mirrors, fastest healthy one first"""
+        def score(host):
+            stats = self.stats.get(host)
+            if stats is None:
+                return (True, float('inf'))
+            health = stats['health']
+            return (health < self.min_health,
+                    stats['latency'] / max(health, 0.1))
+        return sorted(self.mirrors[kind], key=score)
+
+    def best(self, kind):
+        """:return: the fastest healthy `kind` mirror, or the first one
+        listed until the mirrors have been measured"""
+        if len(self.mirrors[kind]) == 1:
+            return self.mirrors[kind][0]
+        if kind not in self.probed or \
+                time.time() - self.probed[kind] > self.ttl:
+            self.reprobe(kind)
+        return self.ranked(kind)[0]
+
+    def probe(self, kind):
+        """Measure every `kind` mirror concurrently and save the ranking"""
+        from multiprocessing.pool import ThreadPool
+        hosts = self.mirrors[kind]
+        logging.debug('probing %s mirrors', kind)
+        workers = ThreadPool(len(hosts))
+        try:
+            results = workers.map(
+                self._measure, [self.probe_urls[kind] % host for host in hosts])
+        finally:
+            workers.close()
+        with self._lock:
+            for host, (ok, latency) in zip(hosts, results):
+                self._update(host, ok, latency)
+            self.probed[kind] = time.time()
+            self._save()
+        logging.debug('%s mirrors: %s', kind, ', '.join(self.ranked(kind)))
+
+    def reprobe(self, kind):
+        """Probe the `kind` mirrors in a background thread, unless already
+        doing so"""
+        with self._lock:
+            if kind in self._probing:
+                return
+            self._probing.add(kind)
+
+        def run():
+            try:
+                self.probe(kind)
+            finally:
+                with self._lock:
+                    self._probing.discard(kind)
+        thread = threading.Thread(target=run, name='probe-%s' % kind)
+        thread.daemon = True
+        thread.start()
+
+    def report(self, host, ok, kinds=None):
+        """Record the outcome of a real request to `host`; a failing best
+        mirror triggers a background re-probe
+
+        :param kinds: only rank the mirrors of these kinds, all if None
+        """
+        for kind, hosts in self.mirrors.items():
+            if host not in hosts or kinds is not None and kind not in kinds:
+                continue
+            with self._lock:
+                best = self.ranked(kind)[0]
+                self._update(host, ok)
+                self._save()
+            if not ok and host == best and self.ranked(kind)[0] != host:
+                logging.debug('%s mirror %s degraded', kind, host)
+                self.reprobe(kind)
+
+    def _measure(self, url):
+        """:return: (success, latency in seconds) of a HEAD request of
+        `url`, following redirects to the same host"""
+        start = time.time()
+        ok = False
+        try:
+            for _ in range(5):
+                parts = urlparse.urlsplit(url)
+                connection = httplib.HTTPSConnection \
+                    if parts.scheme == 'https' else httplib.HTTPConnection
+                conn = connection(parts.netloc, timeout=self.probe_timeout)
+                try:
+                    conn.request('HEAD', urlparse.urlunsplit(
+                        ('', '', parts.path or '/', parts.query, '')),
+                        headers={'User-Agent': httpbibdesk.USER_AGENT})
+                    response = conn.getresponse()
+                finally:
+                    conn.close()
+                location = response.getheader('location')
+                if response.status not in httpbibdesk.REDIRECT_CODES or \
+                        not location:
+                    ok = 200 <= response.status < 300
+                    break
+                url = urlparse.urljoin(url, location)
+                if urlparse.urlsplit(url).hostname != parts.hostname:
+                    # not a mirror, but a pointer to another host
+                    break
+        except (socket.error, httplib.HTTPException):
+            ok = False
+        latency = time.time() - start if ok else self.probe_timeout
+        return ok, latency
+
+    def _update(self, host, ok, latency=None):
+        stats = self.stats.get(host)
+        if stats is None:
+            self.stats[host] = {'health': float(ok),
+                                'latency': latency or self.probe_timeout}
+            return
+        a = self.smoothing
+        stats['health'] = (1 - a) * stats['health'] + a * ok
+        if latency is not None:
+            stats['latency'] = (1 - a) * stats['latency'] + a * latency
+
+    def _save(self):
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'probed': self.probed, 'stats': self.stats}, f)
+            os.rename(tmp, self.path)
+        except (IOError, OSError), err:
+            logging.debug('could not save mirror ranking: %s', err)
+
+
+# MirrorRanking instances shared by all parsers, by path
+_mirror_rankings = {}
+_mirror_rankings_lock = threading.Lock()
+
+
+def mirror_ranking(prefs):
+    """:return: the `MirrorRanking` configured in `prefs`, or None if
+    disabled"""
+    path = prefs['mirror_rank_path']
+    if not path or not prefs['mirror_rank_ttl']:
+        return None
+    path = os.path.expanduser(path)
+    with _mirror_rankings_lock:
+        if path not in _mirror_rankings:
+            _mirror_rankings[path] = MirrorRanking(
+                path, prefs['mirror_rank_ttl'],
+                {'ads': ADS_MIRRORS, 'arxiv': ARXIV_MIRRORS},
+                MIRROR_PROBE_URLS)
+        return _mirror_rankings[path]
+
+
+def get_mirror(prefs, kind):
+    """:return: the `kind` ('ads' or 'arxiv') mirror set in `prefs`, or the
+    fastest healthy one if unset or set to auto"""
+    mirror = prefs['%s_mirror' % kind]
+    if mirror and mirror != 'auto':
+        return mirror
+    ranking = mirror_ranking(prefs)
+    if ranking is None:
+        return {'ads': ADS_MIRRORS, 'arxiv': ARXIV_MIRRORS}[kind][0]
+    return ranking.best(kind)
+
+
+def report_mirror(prefs, url, ok):
+    """Feed the outcome of a request to `url` back to the mirror ranking,
+    for the kinds of mirrors chosen by it"""
+    kinds = [kind for kind in ('ads', 'arxiv')
+             if prefs['%s_mirror' % kind] in (None, 'auto')]
+    ranking = kinds and mirror_ranking(prefs)
+    if ranking:
+        ranking.report(urlparse.urlsplit(url).netloc, ok, kinds)
 
 
 class ADSConnector(object):
     """Receives input (token), derives an ADS url, and attempts to connect
-    to the corresponding ADS abstract page with urllib2.urlopen().
+    to the corresponding ADS abstract page with httpbibdesk.urlopen().
 
-    Tokens are tested in order of:
+    Tokens are first classified offline by `classify_token()`, and only the
+    matching resolver is queried. Unrecognised tokens are tested in order of:
 
     - CDS preprint number
     - arxiv identifiers
@@ -746,21 +1210,42 @@ class ADSConnector(object):
     - ADS urls
     - arxiv urls
     """
-    def __init__(self, token, prefs):
+    def __init__(self, token, prefs, batch_bibs=None):
         super(ADSConnector, self).__init__()
         self.token = str(token)
         self.prefs = prefs
         self.ads_url = None  # string URL to ADS
-        self.ads_read = None  # a urllib2.urlopen connection to ADS
+        self.ads_read = None  # the page read from ADS
+        self.bibtex = None
+        self.arxiv_id = None
         self.url_parts = urlparse.urlsplit(token)  # supposing it is a URL
-
-        if self._is_CDS():
+        # what the probes below fetched, by server ('CDS', 'Inspires'), so
+        # that the resolvers reuse it instead of fetching it again
+        self.resolved = {}
+
+        kind, ident = classify_token(self.token)
+        logging.debug("ADSConnector classified %s as %s", self.token, kind)
+        if kind is not None:
+            self.token = ident
+        if kind == 'bibcode':
+            logging.debug("ADS lookups are disabled, skipping bibcode %s",
+                          self.token)
+
+        cds_entry = None
+        if kind == 'report':
+            cds_entry = (batch_bibs or {}).get(
+                identbibdesk.canonical('report', self.token))
+        if cds_entry is not None:
+            logging.debug("CDS report %s already resolved in batch (%s)",
+                          self.token, cds_entry.url)
+        elif kind in ('report', None) and self._probe('CDS'):
             logging.debug("ADSConnector found CDS ID %s", self.token)
             notify('CDS page found for', self.token,
                    'Parsing the XML page...')
 
             cds_entry = cdsbibdesk.CDSParser()
-            cds_entry.parse_at_id(self.token)
+            cds_entry.parse_at_id(self.token, xml=self.resolved.get('CDS'))
+        if cds_entry is not None:
             self.bibtex = cds_entry.bib
             self.ads_url = cds_entry.ads_url
             self.ads_read = True
@@ -770,7 +1255,9 @@ class ADSConnector(object):
             #self.pdf_link = cds_entry.pdf_link
             #cds_entry.bibtex =
 
-        if self._is_arxiv():
+        if kind == 'arxiv':
+            self.arxiv_id = self.token
+        if self.arxiv_id or (kind is None and self._is_arxiv()):
             logging.debug("ADSConnector found on arXiv API the arXiv ID %s", self.token)
             # Try to open the ADS page
             #if not self._read(self.ads_url):
@@ -778,75 +1265,61 @@ class ADSConnector(object):
             #logging.debug('ADS page (%s) not found for %s' %
             #              (self.ads_url, self.token))
             notify('Parsing the arXiv page for', self.token, '')
-            arxiv_bib = ArXivParser()
-            try:
-                logging.debug("searching on arXiv API with parse_at_id for %s", self.arxiv_id)
-                arxiv_bib.parse_at_id(self.arxiv_id)
-                # this defines properties arxiv_bib.info an arxiv_bib.bib with
-                # a dictionary of the bibtex and a objects-based bibtex entry
-                # e.g arxiv_bib.bib.Title
-                # finally it can be casted as a string, which is the bibtex entry
-                # itself. I will achieve (hopefully) such string by ar CDS query
-                logging.debug(
-                    "arXiv page (%s) parsed for %s"
-                    % (arxiv_bib.url, self.token))
-                #logging.debug('bibtex=',arxiv_bib.bib)
-            except ArXivException, err:
-                logging.debug("arXiv API failed, you're in trouble...")
-                raise ADSException(err)
+            arxiv_bib = (batch_bibs or {}).get(self.arxiv_id)
+            if arxiv_bib is not None:
+                logging.debug("arXiv ID %s already resolved in batch (%s)",
+                              self.arxiv_id, arxiv_bib.url)
+            else:
+                arxiv_bib = ArXivParser()
+                try:
+                    logging.debug("searching on arXiv API with parse_at_id for %s", self.arxiv_id)
+                    arxiv_bib.parse_at_id(self.arxiv_id)
+                    # this defines properties arxiv_bib.info an arxiv_bib.bib with
+                    # a dictionary of the bibtex and a objects-based bibtex entry
+                    # e.g arxiv_bib.bib.Title
+                    # finally it can be casted as a string, which is the bibtex entry
+                    # itself. I will achieve (hopefully) such string by ar CDS query
+                    logging.debug(
+                        "arXiv page (%s) parsed for %s"
+                        % (arxiv_bib.url, self.token))
+                    #logging.debug('bibtex=',arxiv_bib.bib)
+                except ArXivException, err:
+                    logging.debug("arXiv API failed, you're in trouble...")
+                    raise ADSException(err)
 
             # dummy ads_read and bibtex
             self.ads_read = True
             self.bibtex = arxiv_bib
 
 
-        is_Inspires_DOI = self._is_Inspires_DOI()
+        is_Inspires_DOI = kind in ('doi', None) and \
+            self._probe('Inspires_DOI')
 
         if is_Inspires_DOI:
-            from xml.etree import ElementTree
-            # change self.token into a RECID
+            # the DOI search already returned the whole record
             logging.debug(' token from DOI %s' % self.token )
-            url_by_DOI = 'https://inspirehep.net/search?ln=en&p=doi+'+self.token+'&of=xm'
-            _xml=ElementTree.fromstring(urllib2.urlopen(url_by_DOI).read())
-            'https://inspirehep.net/search?ln=en&p=recid+'+self.token+'&of=xm'
-            self.token = cdsbibdesk.find_recid_in_xml(_xml)
+            self.token = self.resolved['Inspires'].recid
             logging.debug(' new token %s' % self.token )
 
         # print "is_Inspires_RECID"
-        is_Inspires_RECID = self._is_Inspires_RECID()
+        is_Inspires_RECID = is_Inspires_DOI or \
+            kind in ('recid', None) and self._probe('Inspires_RECID')
 
         if is_Inspires_RECID: # RECID or DOI
             logging.debug("ADSConnector found on Inspires through the RECID or DOI %s", self.token)
             notify('Inspires data found for', self.token,
-                   'Parsing the XML and BibTeX output page...')
+                   'Parsing the Inspire record...')
 
-            # Obtain Inspires Bibtex
-            logging.debug("fetching BibTeX from Inspires web pages for %s" % self.arxiv_id)
-            try:
-                url_string = "https://labs.inspirehep.net/api/literature/"+ self.token
-                request = urllib2.Request(url_string, headers={"accept" : "application/x-bibtex"})
-                contents = urllib2.urlopen(request).read()
-                logging.debug(contents)
-                logging.debug(type(contents))
-                if len(contents)>0:
-                    bibtex_string =  contents
-                    #if print_bibtex:
-                    print bibtex_string
-
-            except (urllib2.HTTPError, urllib2.URLError), err:
-                logging.debug("fetching BibTeX from Inspires failed on URL: %s", url_string)
-                #logging.debug(err.code,err.args)
-
-            # populate the attributes as if it were a CDS or arxiv_bib
-            cds_entry = cdsbibdesk.CDSParser()
-            cds_entry.parse_at_id(self.token,server='Inspires')
-            self.bibtex = cds_entry.bib
-            self.ads_url = cds_entry.ads_url
+            # populate the attributes as if it were a CDS or arxiv_bib,
+            # from the Inspire JSON record fetched by the probe
+            inspire_entry = self.resolved['Inspires']
+            self.bibtex = inspire_entry.bib
+            self.ads_url = inspire_entry.ads_url
             self.ads_read = True
             logging.debug(self.ads_url)
             logging.debug(
-                    "Inspires page (%s) parsed for %s"
-                    % (url_string, self.token))
+                    "Inspires record (%s) parsed for %s"
+                    % (inspire_entry.url, self.token))
 
         if hasattr(self.bibtex, 'bib' ):
             logging.debug(self.bibtex.bib)
@@ -899,53 +1372,70 @@ class ADSConnector(object):
                 logging.debug("ADSConnector found ADS page %s", self.token)
         '''
 
+    def _probe(self, probe):
+        """Run the `_is_<probe>` test on the token, unless the negative cache
+        knows it already failed.
+
+        Probes return None when the server could not be queried; only
+        definite misses (False) are remembered.
+        """
+        misses = negative_cache(self.prefs)
+        if misses is not None and misses.missed(probe, self.token):
+            logging.debug("%s probe known to fail for %s", probe, self.token)
+            return False
+        found = getattr(self, '_is_' + probe)()
+        if found is False and misses is not None:
+            misses.add(probe, self.token)
+        return found
+
     def _is_CDS(self):
         """Try to classify the token as CDS article by getting the recid:
-        :return: True if CDS recid is recovered
+        :return: True if CDS recid is recovered, None if CDS could not be
+            queried
         """
         from xml.etree import ElementTree
-        url = 'https://cds.cern.ch/search?ln=en&p=reportnumber%3A"' + self.token + '"&action_search=Search&op1=a&m1=a&p1=&f1=&c=CERN+Document+Server&sf=&so=d&rm=&rg=10&sc=1&of=xm'
+        # same URL as CDSParser.parse_at_id, answered from the cache there
+        url = cdsbibdesk.CDS_SEARCH_URL % (
+            urllib.quote('reportnumber:"%s"' % self.token), 10)
         try:
-            xml = ElementTree.fromstring(urllib2.urlopen(url).read())
-        except (urllib2.HTTPError, urllib2.URLError), err:
-            logging.debug("ArXivParser failed on URL: %s", url)
-            raise ArXivException(err)
+            xml = ElementTree.fromstring(httpbibdesk.fetch(url))
+        except (urllib2.HTTPError, urllib2.URLError, SyntaxError), err:
+            logging.debug("CDS search failed on URL %s: %s", url, err)
+            return None
         if xml.find(".//*[@tag='001']")>0:
+            self.resolved['CDS'] = xml
             return True
         return False
 
-    # TODO: DOI from Inspires
-    #https://labs.inspirehep.net/api/literature?q=doi=10.1063/1.3293892
-    # or directly in BibTex
-    # curl -H "accept: application/x-bibtex" https://labs.inspirehep.net/api/literature?q=doi=10.1063/1.3293892
-
-    # TODO recid from Inspires
-    #curl -H "accept: application/x-bibtex" https://labs.inspirehep.net/api/literature/123456
     def _is_Inspires_RECID(self):
+        """Try to find the token as an Inspire record number
+        :return: True if the Inspire record is recovered
+        """
+        inspire_entry = cdsbibdesk.InspireParser()
         try:
-            url_string = "https://inspirehep.net/api/literature/"+ self.token
-            request = urllib2.Request(url_string, headers={"accept" : "application/x-bibtex"})
-            contents = urllib2.urlopen(request).read()
-            logging.debug(contents)
-            logging.debug(type(contents))
-            if len(contents)>0:
-                return True
-        except (urllib2.HTTPError, urllib2.URLError), err:
-            logging.debug("RECID search failed on URL: %s", url_string)
-        return False
+            inspire_entry.parse_at_id(self.token)
+        except cdsbibdesk.InspireNotFound:
+            return False
+        except cdsbibdesk.InspireException:
+            logging.debug("RECID search failed on URL: %s", inspire_entry.url)
+            return None
+        self.resolved['Inspires'] = inspire_entry
+        return True
 
     def _is_Inspires_DOI(self):
+        """Try to find the token as a DOI known to Inspire
+        :return: True if the Inspire record is recovered
+        """
+        inspire_entry = cdsbibdesk.InspireParser()
         try:
-            url_string = 'https://inspirehep.net/api/literature?q=doi='+ self.token
-            request = urllib2.Request(url_string, headers={"accept" : "application/x-bibtex"})
-            contents = urllib2.urlopen(request).read()
-            logging.debug(contents)
-            logging.debug(type(contents))
-            if len(contents)>0:
-                return True
-        except (urllib2.HTTPError, urllib2.URLError), err:
-            logging.debug("RECID search failed on URL: %s", url_string)
-        return False
+            inspire_entry.parse_at_doi(self.token)
+        except cdsbibdesk.InspireNotFound:
+            return False
+        except cdsbibdesk.InspireException:
+            logging.debug("DOI search failed on URL: %s", inspire_entry.url)
+            return None
+        self.resolved['Inspires'] = inspire_entry
+        return True
 
     def _is_arxiv_via_ADS(self): # DEPRECATED
         """Try to classify the token as an arxiv article, either:
@@ -955,13 +1445,12 @@ class ADSConnector(object):
 
         :return: True if ADS page is recovered
         """
-        arxiv_pattern = re.compile('(\d{4,6}\.\d{4,6}|astro\-ph/\d{7})')
-        arxiv_matches = arxiv_pattern.findall(self.token)
+        arxiv_matches = identbibdesk.find_arxiv_ids(self.token)
         if len(arxiv_matches) == 1:
             self.arxiv_id = arxiv_matches[0]
             self.ads_url = urlparse.urlunsplit((
                 'http',
-                self.prefs['ads_mirror'],
+                get_mirror(self.prefs, 'ads'),
                 'cgi-bin/bib_query',
                 'arXiv:%s' % self.arxiv_id, ''))
             logging.debug('arxiv_id: %s', self.arxiv_id)
@@ -979,8 +1468,7 @@ class ADSConnector(object):
 
         :return: True if arXiv API page is recovered
         """
-        arxiv_pattern = re.compile('(\d{4,6}\.\d{4,6}|.*\-.*/\d{7})')
-        arxiv_matches = arxiv_pattern.findall(self.token)
+        arxiv_matches = identbibdesk.find_arxiv_ids(self.token)
         logging.debug(arxiv_matches)
         if len(arxiv_matches) == 1:
             self.arxiv_id = arxiv_matches[0]
@@ -995,7 +1483,7 @@ class ADSConnector(object):
     def _is_bibcode(self):
         """Test if the token corresponds to an ADS bibcode or DOI"""
         self.ads_url = urlparse.urlunsplit((
-            'http', self.prefs['ads_mirror'],
+            'http', get_mirror(self.prefs, 'ads'),
             'doi/%s' % self.token, '', ''))
         read = self._read(self.ads_url)
         if read:
@@ -1003,7 +1491,7 @@ class ADSConnector(object):
         else:
             self.ads_url = urlparse.urlunsplit((
                 'http',
-                self.prefs['ads_mirror'], 'abs/%s' % self.token, '', ''))
+                get_mirror(self.prefs, 'ads'), 'abs/%s' % self.token, '', ''))
             read = self._read(self.ads_url)
             return read
 
@@ -1013,21 +1501,33 @@ class ADSConnector(object):
         url = self.url_parts
         self.ads_url = urlparse.urlunsplit((
             url.scheme,
-            self.prefs['ads_mirror'],
+            get_mirror(self.prefs, 'ads'),
             url.path, url.query, url.fragment))
         return self._read(self.ads_url)
 
+    def _open(self, url):
+        """:return: httpbibdesk.urlopen() of `url`, whose outcome is
+        reported to the mirror ranking"""
+        try:
+            response = httpbibdesk.urlopen(url)
+        except urllib2.HTTPError, err:
+            # the mirror answered, only server errors count against it
+            report_mirror(self.prefs, url, err.code < 500)
+            raise
+        except urllib2.URLError:
+            report_mirror(self.prefs, url, False)
+            raise
+        report_mirror(self.prefs, url, True)
+        return response
+
     def _read_ads_url(self, ads_url):
-        """Attempt a connection to ads_url, saving the read to
-        self.ads_read.
+        """Attempt a connection to ads_url, saving the open response to
+        self.ads_read, to be streamed by ADSHTMLParser.parse().
 
         :return: True if successful, False otherwise
         """
         try:
-            # remove <head>...</head> - often broken HTML
-            self.ads_read = re.sub(
-                r'<head>[\s\S]*</head>', '',
-                urllib2.urlopen(ads_url).read())
+            self.ads_read = self._open(ads_url)
             return True
         except urllib2.HTTPError:
             return False
@@ -1039,7 +1539,7 @@ class ADSConnector(object):
         :return: True if successful, False otherwise
         """
         try:
-            self.arXivAPI_read = urllib2.urlopen(arXivAPI_url).read()
+            self.arXivAPI_read = self._open(arXivAPI_url).read()
             self.arXivAPI_xml = ElementTree.fromstring( self.arXivAPI_read )
             logging.debug(self.arXivAPI_url)
             logging.debug(self.arXivAPI_xml)
@@ -1053,21 +1553,23 @@ class Preferences(object):
     with by a dictionary-like interface.
     """
 
+    # type of the preferences holding numbers, other values are strings
+    numeric = {'cache_ttl': int,
+               'cache_size': float,
+               'rate_limit': float,
+               'rate_burst': int,
+               'negative_cache_ttl': int,
+               'arxiv_batch_size': int,
+               'cds_batch_size': int,
+               'jobs': int,
+               'max_connections_per_host': int,
+               'max_pdf_size': float,
+               'mirror_rank_ttl': int}
+
     def __init__(self):
         self.prefs_path = os.path.expanduser('~/.adsbibdesk')
-        self._adsmirrors = ['adsabs.harvard.edu',
-                            'cdsads.u-strasbg.fr',
-                            'ukads.nottingham.ac.uk',
-                            'esoads.eso.org',
-                            'ads.ari.uni-heidelberg.de',
-                            'ads.inasan.ru',
-                            'ads.mao.kiev.ua',
-                            'ads.astro.puc.cl',
-                            'ads.on.br',
-                            'ads.nao.ac.jp',
-                            'ads.bao.ac.cn',
-                            'ads.iucaa.ernet.in',
-                            'www.ads.lipi.go.id']
+        self._adsmirrors = ADS_MIRRORS
+        self._arxivmirrors = ARXIV_MIRRORS
 
         self.prefs = self._get_default_prefs()  # Hard coded defaults dict
         new_prefs = self._get_prefs()  # load user prefs from disk
@@ -1104,6 +1606,22 @@ class Preferences(object):
                 "ssh_server": None,
                 "debug": False,
                 "overwrite": False,
+                "cache_path": os.path.expanduser("~/.adsbibdesk.cache"),
+                "cache_ttl": 86400,
+                "cache_size": 50,
+                "rate_limit": 1,
+                "rate_burst": 5,
+                "host_rate_limits": None,
+                "negative_cache_path": os.path.expanduser(
+                    "~/.adsbibdesk.misses"),
+                "negative_cache_ttl": 604800,
+                "arxiv_batch_size": 50,
+                "cds_batch_size": 20,
+                "jobs": 1,
+                "max_connections_per_host": 2,
+                "max_pdf_size": 250,
+                "mirror_rank_path": os.path.expanduser("~/.adsbibdesk.mirrors"),
+                "mirror_rank_ttl": 86400,
                 "log_path": os.path.expanduser("~/.adsbibdesk.log")}
 
     def _get_prefs(self):
@@ -1129,6 +1647,12 @@ class Preferences(object):
                     v = False
                 elif v.strip().lower() == 'none':
                     v = None
+                elif k in self.numeric:
+                    try:
+                        v = self.numeric[k](v)
+                    except ValueError:
+                        logging.debug('ignoring %s=%s, not a number', k, v)
+                        continue
                 prefs[k] = v
 
         return prefs
@@ -1139,12 +1663,18 @@ class Preferences(object):
         """
         prefs = open(self.prefs_path, 'w')
         print >> prefs, """# ADS mirror
+# (auto uses the fastest mirror from where you are)
 ads_mirror=%s
 
 # arXiv mirror
-# (leave it unset to use the arXiv mirror pointed by your ADS mirror)
+# (leave it unset to use the fastest arXiv mirror)
 arxiv_mirror=%s
 
+# mirror latencies are measured again every mirror_rank_ttl seconds
+# (0 to disable, falling back to the main ADS and arXiv sites)
+mirror_rank_path=%s
+mirror_rank_ttl=%s
+
 # download PDFs?
 download_pdf=%s
 
@@ -1153,9 +1683,52 @@ download_pdf=%s
 ssh_user=%s
 ssh_server=%s
 # overwrite bibdesk entry when same title and first author is found
-overwrite=%s""" % (self.prefs['ads_mirror'], self.prefs['arxiv_mirror'],
+overwrite=%s
+
+# arXiv, Inspire and CDS API responses are cached in this directory,
+# and revalidated with the server after cache_ttl seconds
+# (set cache_size, in MB, to 0 to disable the cache)
+cache_path=%s
+cache_ttl=%s
+cache_size=%s
+
+# requests per second and burst allowed per host
+# (set rate_limit to 0 to disable), plus per-host overrides as
+# host:rate:burst,host:rate:burst (export.arxiv.org defaults to 0.33:1)
+rate_limit=%s
+rate_burst=%s
+host_rate_limits=%s
+
+# CDS and Inspire lookups that found nothing are not repeated
+# for negative_cache_ttl seconds (0 to disable)
+negative_cache_path=%s
+negative_cache_ttl=%s
+
+# number of arXiv IDs resolved per arXiv API request, and of CERN report
+# numbers per CDS search
+arxiv_batch_size=%s
+cds_batch_size=%s
+
+# number of articles fetched concurrently when adding many articles,
+# and maximum number of simultaneous connections to the same host
+jobs=%s
+max_connections_per_host=%s
+
+# PDFs larger than this (in MB) are not downloaded
+max_pdf_size=%s""" % (self.prefs['ads_mirror'], self.prefs['arxiv_mirror'],
+                    self.prefs['mirror_rank_path'],
+                    self.prefs['mirror_rank_ttl'],
                     self.prefs['download_pdf'], self.prefs['ssh_user'],
-                    self.prefs['ssh_server'],self.prefs['overwrite'])
+                    self.prefs['ssh_server'], self.prefs['overwrite'],
+                    self.prefs['cache_path'], self.prefs['cache_ttl'],
+                    self.prefs['cache_size'], self.prefs['rate_limit'],
+                    self.prefs['rate_burst'], self.prefs['host_rate_limits'],
+                    self.prefs['negative_cache_path'],
+                    self.prefs['negative_cache_ttl'],
+                    self.prefs['arxiv_batch_size'],
+                    self.prefs['cds_batch_size'], self.prefs['jobs'],
+                    self.prefs['max_connections_per_host'],
+                    self.prefs['max_pdf_size'])
 
         prefs.close()
 
@@ -1163,6 +1736,10 @@ overwrite=%s""" % (self.prefs['ads_mirror'], self.prefs['arxiv_mirror'],
     def adsmirrors(self):
         return self._adsmirrors
 
+    @property
+    def arxivmirrors(self):
+        return self._arxivmirrors
+
 
 class BibTex(object):
 
@@ -1170,61 +1747,276 @@ class BibTex(object):
         """
         Create BibTex instance from ADS BibTex URL
         """
-        bibtex = urllib2.urlopen(url).readlines()
+        bibtex = httpbibdesk.urlopen(url).readlines()
         bibtex = ' '.join([l.strip() for l in bibtex]).strip()
-        bibtex = bibtex[re.search('@[A-Z]+\{', bibtex).start():]
         self.type, self.bibcode, self.info = self.parsebib(bibtex)
 
     def __str__(self):
-        return (','.join(
-            ['@' + self.type + '{' + self.bibcode] +
-            ['%s=%s' % (i, j) for i, j in self.info.items()]) + '}').\
-            encode('utf-8')
+        return bibtexbibdesk.format_entry(
+            self.type, self.bibcode, self.info.iteritems()).encode('utf-8')
 
     def parsebib(self, bibtex):
         """
-        Parse bibtex code into dictionary
+        Parse the first entry of bibtex code into type, bibcode and an
+        ordered dictionary of raw field values
         """
-        r = re.search(
-            '(?<=^@)(?P<type>[A-Z]+){(?P<bibcode>\S+)(?P<info>,.+)}$',
-            bibtex)
-        s = re.split('(,\s\w+\s=\s)', r.group('info'))
-        info = dict(
-            [(i[1:].replace('=', '').strip(), j.strip())
-                for i, j in zip(s[1::2], s[2::2])])
-        return r.group('type'), r.group('bibcode'), info
+        entry = bibtexbibdesk.parse_entry(bibtex)
+        return entry.type, entry.key, entry.fields
+
+
+def _trigrams(text):
+    """:return: dict of lower case character trigram -> count in `text`"""
+    text = text.lower()
+    grams = {}
+    for i in range(len(text) - 2):
+        gram = text[i:i + 3]
+        grams[gram] = grams.get(gram, 0) + 1
+    return grams
+
+
+class TitleIndex(object):
+    """Titles of publications, by id, for fuzzy duplicate lookups.
+
+    `get_close_matches()` gives the same answers as the difflib function,
+    but only scores the titles that share enough character trigrams with
+    the query. For a ratio of 2 * M / T (M matching characters, T the sum
+    of both lengths), SequenceMatcher finds at most T - 2 * M + 1 matching
+    blocks, which hold at least M - 2 per block common trigrams, hence at
+    least (2.5 * cutoff - 2) * T - 2 of them within `cutoff`. Candidates
+    are only looked up by the rarest trigrams of the query, enough of them
+    that a title missing all of these cannot share the others.
+    """
+
+    def __init__(self, titles=()):
+        """:param titles: (id, title) pairs"""
+        self.titles = {}
+        # id -> {trigram: count}
+        self._grams = {}
+        # trigram -> {id: count}
+        self._postings = {}
+        # title length -> set of ids
+        self._lengths = {}
+        for key, title in titles:
+            self.add(key, title)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, key):
+        return key in self.titles
+
+    def add(self, key, title):
+        """Index `title` as the title of publication `key`"""
+        self.discard(key)
+        if title is None:
+            return
+        self.titles[key] = title
+        self._grams[key] = grams = _trigrams(title)
+        for gram, count in grams.iteritems():
+            self._postings.setdefault(gram, {})[key] = count
+        self._lengths.setdefault(len(title), set()).add(key)
+
+    def discard(self, key):
+        """Forget the title of publication `key`, if indexed"""
+        title = self.titles.pop(key, None)
+        if title is None:
+            return
+        for gram in self._grams.pop(key):
+            postings = self._postings[gram]
+            del postings[key]
+            if not postings:
+                del self._postings[gram]
+        keys = self._lengths[len(title)]
+        keys.discard(key)
+        if not keys:
+            del self._lengths[len(title)]
+
+    def candidates(self, word, cutoff):
+        """:return: ids of the titles that may be within `cutoff` of
+        `word`, a superset of those that are"""
+        grams = _trigrams(word)
+        slope = 2.5 * cutoff - 2
+        # shared trigrams needed by the shortest title that real_quick_ratio
+        # lets through, with a float safety margin as the bound may be loose
+        shortest = int(len(word) * cutoff / (2 - cutoff))
+        needed = slope * (len(word) + shortest) - 2.001
+        # look up the rarest trigrams, until those left are too few
+        probes = []
+        left = sum(grams.values())
+        for gram in sorted(grams, key=lambda g: len(self._postings.get(g, ()))):
+            if left < needed:
+                break
+            probes.append(gram)
+            left -= grams[gram]
+        keys = set()
+        for gram in probes:
+            keys.update(self._postings.get(gram, ()))
+        longest = cutoff and len(word) * (2 - cutoff) / cutoff + 1e-9
+        found = []
+        for key in keys:
+            if cutoff and not shortest <= len(self.titles[key]) <= longest:
+                # fails real_quick_ratio anyway
+                continue
+            other = self._grams[key]
+            shared = sum([min(count, other[gram])
+                          for gram, count in grams.iteritems()
+                          if gram in other])
+            if shared >= slope * (len(word) + len(self.titles[key])) - 2.001:
+                found.append(key)
+        # titles too short to be required to share any trigram
+        for length, short in self._lengths.iteritems():
+            if slope * (len(word) + length) - 2.001 <= 0:
+                found.extend(short - keys)
+        return found
+
+    def get_close_matches(self, word, n=3, cutoff=0.6):
+        """:return: list of the (at most `n`) best titles within `cutoff`
+        of `word`, as `difflib.get_close_matches(word, titles, n, cutoff)`
+        """
+        if not n > 0:
+            raise ValueError("n must be > 0: %r" % (n,))
+        if not 0.0 <= cutoff <= 1.0:
+            raise ValueError("cutoff must be in [0.0, 1.0]: %r" % (cutoff,))
+        result = []
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(word)
+        for key in self.candidates(word, cutoff):
+            matcher.set_seq1(self.titles[key])
+            if matcher.real_quick_ratio() >= cutoff and \
+                    matcher.quick_ratio() >= cutoff and \
+                    matcher.ratio() >= cutoff:
+                result.append((matcher.ratio(), self.titles[key]))
+        return [title for score, title in heapq.nlargest(n, result)]
+
+
+class IdentifierIndex(object):
+    """Publications by the canonical keys of their identifiers (see
+    `identbibdesk.record_keys()`), to recognise tokens of publications
+    already in the library without resolving them."""
+
+    def __init__(self, records=()):
+        """:param records: (id, fields) pairs, fields being a dict of lower
+            case field name -> value"""
+        # canonical key -> set of ids
+        self.ids = {}
+        # id -> canonical keys
+        self._keys = {}
+        for pid, fields in records:
+            self.add(pid, fields)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, pid, fields):
+        """Index the identifiers in the `fields` of publication `pid`"""
+        self.discard(pid)
+        keys = identbibdesk.record_keys(
+            fields.get('doi'), fields.get('eprint'), fields.get('adsurl'),
+            fields.get('url'))
+        self._keys[pid] = keys
+        for key in keys:
+            self.ids.setdefault(key, set()).add(pid)
+
+    def discard(self, pid):
+        """Forget the identifiers of publication `pid`, if indexed"""
+        for key in self._keys.pop(pid, ()):
+            pids = self.ids[key]
+            pids.discard(pid)
+            if not pids:
+                del self.ids[key]
+
+    def find(self, token):
+        """:return: id of a publication with the identifier of `token`, or
+        None"""
+        pids = self.ids.get(identbibdesk.key(token))
+        return min(pids) if pids else None
+
+
+class LibrarySnapshot(object):
+    """The titles and identifier fields of the publications of the BibDesk
+    document, by id, with title and identifier indexes.
+
+    Taken once, then updated in place as publications are imported or
+    deleted, rather than fetched again from BibDesk.
+    """
+
+    def __init__(self, records=()):
+        """:param records: (id, fields) pairs, fields being a dict of lower
+            case field name -> value, title included"""
+        # id -> fields
+        self.records = {}
+        # title -> ids
+        self.titles = {}
+        self.title_index = TitleIndex()
+        self.identifier_index = IdentifierIndex()
+        for pid, fields in records:
+            self.add(pid, fields)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, pid):
+        return pid in self.records
+
+    def add(self, pid, fields):
+        """Add (or update) publication `pid`"""
+        self.discard(pid)
+        self.records[pid] = fields
+        self.titles.setdefault(fields.get('title'), []).append(pid)
+        self.title_index.add(pid, fields.get('title'))
+        self.identifier_index.add(pid, fields)
+
+    def discard(self, pid):
+        """Remove publication `pid`, if present"""
+        fields = self.records.pop(pid, None)
+        if fields is None:
+            return
+        pids = self.titles[fields.get('title')]
+        pids.remove(pid)
+        if not pids:
+            del self.titles[fields.get('title')]
+        self.title_index.discard(pid)
+        self.identifier_index.discard(pid)
+
+    def pids(self, title):
+        """:return: ids of the publications titled `title`"""
+        return list(self.titles.get(title, ()))
 
 
 class BibDesk(object):
+
+    # fields of the publications kept in the snapshot, besides the title
+    snapshot_fields = ('Doi', 'Eprint', 'Adsurl', 'Url')
+
+    # name of the handler wrapping every script, see tell()
+    handler = 'bibdesk_command'
+    # compiled scripts kept at most
+    max_scripts = 256
+
     def __init__(self):
         """
         Manage BibDesk publications using AppKit
         """
-        self.app = AppKit.NSAppleScript.alloc()
+        # compiled NSAppleScript, by source
+        self._scripts = {}
         self.refresh()
 
-    def __call__(self, cmd, pid=None, strlist=False, error=False):
+    def __call__(self, cmd, pid=None, strlist=False, error=False, args=()):
         """
         Run AppleScript command on first document of BibDesk
-        :param cmd: AppleScript command string
+        :param cmd: AppleScript command template, each %s standing for one
+            of `args`
         :param pid: address call to first/last publication of document
         :param strlist: return output as list of string
         :param error: return full output of call, including error
+        :param args: strings passed to the command, not interpolated
         """
-
-
         if pid is None:
             # address all publications
-            cmd = 'tell first document of application "BibDesk" to %s' % cmd
             print 'pid was *None*, so cmd=',cmd
         else:
             print 'pid was NOT None, so cmd=',cmd
-            # address a single publication
-            print 'cmd=',cmd
-            cmd = 'tell first document of application "BibDesk" to '\
-                  'tell first publication whose id is "%s" to %s' % (pid, cmd)
-
-        output = self.app.initWithSource_(cmd).executeAndReturnError_(None)
+        output = self.tell([cmd], pid, args)
         if not error:
             output = output[0]
             if strlist:
@@ -1239,11 +2031,116 @@ class BibDesk(object):
                 'of application "BibDesk"', error=True)[1] is not None:
             # create blank one
             self('tell application "BibDesk" to make new document')
-        self.titles = self('return title of publications', strlist=True)
-        self.ids = self('return id of publications', strlist=True)
+        ids = self('return id of publications', strlist=True)
+        columns = [self('return title of publications', strlist=True)] + [
+            self('return value of field %s of publications', strlist=True,
+                 args=[name]) for name in self.snapshot_fields]
+        self.snapshot = LibrarySnapshot(
+            (pid, self._fields(values))
+            for pid, values in zip(ids, zip(*columns)))
+
+    def _fields(self, values):
+        """:return: dict of lower case field name -> value, from the values
+        of the title and `snapshot_fields`"""
+        return dict(zip(
+            ['title'] + [name.lower() for name in self.snapshot_fields],
+            values))
+
+    def snapshot_query(self):
+        """:return: AppleScript list items for the title and
+        `snapshot_fields` of a publication"""
+        return 'title, %s' % ', '.join(
+            ['value of field "%s"' % name for name in self.snapshot_fields])
+
+    def indexed(self, pid, values=None):
+        """Add the new publication `pid` to the snapshot
+
+        :param values: result of `snapshot_query()` for `pid`, if known
+        """
+        if values is None:
+            values = self('return {%s}' % self.snapshot_query(), pid,
+                          strlist=True)
+        self.snapshot.add(pid, self._fields(values))
 
-    def pid(self, title):
-        return self.ids[self.titles.index(title)]
+    def tell(self, commands, pid=None, args=()):
+        """
+        Run AppleScript statements as a single script on first document of
+        BibDesk.
+
+        The script is a handler taking `pid` and `args` as parameters, so
+        that it is compiled once for all the calls with the same statements.
+        :param commands: list of AppleScript statements, %s standing for
+            each of `args` in turn
+        :param pid: address the statements to this publication
+        :param args: strings passed to the statements
+        :return: (output, error) of the script
+        """
+        names = ['arg%i' % (i + 1) for i in range(len(args))]
+        body = u'\n'.join([cmd.decode('utf-8') if isinstance(cmd, str)
+                           else cmd for cmd in commands])
+        if names:
+            body %= tuple(names)
+        if pid is not None:
+            body = u'tell first publication whose id is pubid\n%s\nend tell' \
+                % body
+            names = ['pubid'] + names
+            args = [pid] + list(args)
+        source = u'on %s(%s)\ntell first document of application "BibDesk"' \
+            u'\n%s\nend tell\nend %s' % (self.handler, ', '.join(names), body,
+                                          self.handler)
+        return self._compiled(source).executeAppleEvent_error_(
+            handler_event(self.handler, args), None)
+
+    def _compiled(self, source):
+        """:return: the NSAppleScript of `source`, compiled on first use"""
+        script = self._scripts.get(source)
+        if script is None:
+            logging.debug('compiling AppleScript:\n%s' % source)
+            if len(self._scripts) >= self.max_scripts:
+                self._scripts.clear()
+            script = AppKit.NSAppleScript.alloc().initWithSource_(source)
+            compiled, error = script.compileAndReturnError_(None)
+            if not compiled:
+                logging.debug('AppleScript compilation failed: %s' % error)
+            self._scripts[source] = script
+        return script
+
+    def close(self):
+        """Release the compiled scripts"""
+        self._scripts.clear()
+
+    def batch(self, pid):
+        """:return: a `BibDeskBatch` of commands to publication `pid`"""
+        return BibDeskBatch(self, pid)
+
+    def unindexed(self, pid):
+        """Remove the deleted publication `pid` from the snapshot"""
+        self.snapshot.discard(pid)
+
+    def pid(self, title, author=None):
+        """
+        :return: id of the publication titled `title`; of the one whose
+            first author is closest to `author`, if several are
+        """
+        pids = self.snapshot.pids(title)
+        if len(pids) > 1 and author:
+            return max(pids, key=lambda pid: difflib.SequenceMatcher(
+                None, (self.authors(pid) or [''])[0], author).ratio())
+        return pids[0]
+
+    def library_path(self):
+        """
+        :return: POSIX path of the .bib file of the document, or None if
+            it has never been saved or has unsaved changes
+        """
+        modified = self('return modified')
+        if modified is None or modified.booleanValue():
+            return None
+        path = self('return POSIX path of (get file)')
+        path = path and path.stringValue()
+        if path and os.path.isfile(path):
+            return path
+        return None
 
     def authors(self, pid):
         """
@@ -1285,19 +2182,108 @@ class BibDesk(object):
                         os.remove(f)
         # delete publication
         self('delete', pid)
+        self.unindexed(pid)
         return keptPDFs
 
 
+class BibDeskBatch(object):
+    """Commands to a BibDesk publication, collected to be run as a single
+    script, i.e. a single Apple Event round trip, by `run()`.
+
+    Each command is run in its own try block, so that a failing one is
+    skipped as if it had been sent on its own.
+    """
+
+    def __init__(self, bibdesk, pid):
+        self.bibdesk = bibdesk
+        self.pid = pid
+        self.commands = []
+        self.args = []
+
+    def __call__(self, cmd, *args):
+        """Add the AppleScript command `cmd`, each %s standing for one of
+        `args`"""
+        self.commands.append(cmd)
+        self.args.extend(args)
+
+    def run(self, query=None):
+        """
+        Run the commands collected so far, then return `query`
+        :param query: AppleScript expression, evaluated last
+        :return: value of `query` as (nested lists of) strings, or None if
+            there is no query or the script failed
+        """
+        commands = ['try\n%s\nend try' % cmd for cmd in self.commands]
+        args = self.args
+        self.commands, self.args = [], []
+        if query is not None:
+            commands.append('return ' + query)
+        elif not commands:
+            return None
+        output, error = self.bibdesk.tell(commands, self.pid, args)
+        if error is not None:
+            logging.debug('AppleScript batch failed: %s' % error)
+            return None
+        return applescript_value(output) if query is not None else None
+
+
+# AppleEvent descriptor type of lists, 'list'
+TYPE_AE_LIST = 0x6c697374
+# Apple Event calling a script handler: event class and id, and keywords
+# of the handler name and of its parameters ('ascr', 'psbr', 'snam', '----')
+AE_SCRIPT_SUITE = 0x61736372
+AE_SUBROUTINE = 0x70736272
+AE_SUBROUTINE_NAME = 0x736e616d
+AE_DIRECT_OBJECT = 0x2d2d2d2d
+
+
+def applescript_value(descriptor):
+    """:return: the strings of an AppleScript result, lists as lists"""
+    if descriptor is None:
+        return None
+    if descriptor.descriptorType() == TYPE_AE_LIST:
+        return [applescript_value(descriptor.descriptorAtIndex_(i + 1))
+                for i in range(descriptor.numberOfItems())]
+    return descriptor.stringValue()
+
+
+def handler_event(name, args):
+    """:return: Apple Event calling the handler `name` of a script, with
+    the strings `args` as parameters"""
+    descriptor = AppKit.NSAppleEventDescriptor
+    event = descriptor.\
+        appleEventWithEventClass_eventID_targetDescriptor_returnID_transactionID_(
+            AE_SCRIPT_SUITE, AE_SUBROUTINE, descriptor.nullDescriptor(),
+            -1, 0)  # kAutoGenerateReturnID, kAnyTransactionID
+    event.setParamDescriptor_forKeyword_(
+        descriptor.descriptorWithString_(name.lower()), AE_SUBROUTINE_NAME)
+    params = descriptor.listDescriptor()
+    for i, arg in enumerate(args):
+        if isinstance(arg, str):
+            arg = arg.decode('utf-8')
+        params.insertDescriptor_atIndex_(
+            descriptor.descriptorWithString_(arg or u''), i + 1)
+    event.setParamDescriptor_forKeyword_(params, AE_DIRECT_OBJECT)
+    return event
+
+
 class ADSException(Exception):
     pass
 
 
 class ADSHTMLParser(HTMLParser):
 
+    # arXiv identifier quoted in the abstract page
+    arxiv_pattern = identbibdesk.ARXIV_PREFIXED_SEARCH
+    # <head>...</head> - often broken HTML
+    head_pattern = re.compile(r'<head>[\s\S]*?</head>', re.I)
+    # bytes fed to the parser at a time when parsing a stream
+    chunk_size = 2 ** 13
+
     def __init__(self, *args, **kwargs):
         HTMLParser.__init__(self)
         self.links = {}
-        self.tag = ''
+        self.tag = []  # text of the abstract or comment being read
         self.get_abs = False
         # None = not seen yet, False = seen but do not store yet, True = store
         self.get_comment = None
@@ -1314,40 +2300,31 @@ class ADSHTMLParser(HTMLParser):
 
     def mathml(self):
         """
-        Generate dictionary with MathML -> unicode conversion from
-        http://www.w3.org/Math/characters/byalpha.html
+        Dictionary with MathML -> unicode conversion, bundled in
+        mathmlbibdesk and only imported the first time it is needed
         """
-        w3 = 'http://www.w3.org/Math/characters/byalpha.html'
-        mathml = re.search('(?<=<pre>).+(?=</pre>)',
-                           urllib2.urlopen(w3).read(), re.DOTALL).group()
-        entities = {}
-        for l in mathml[:-1].splitlines():
-            s = l.split(',')
-            # ignore double hex values like 'U02266-00338'
-            if '-' not in s[1]:
-                # hexadecimal -> int values, for unichr
-                entities[s[0].strip()] = int(s[1].strip()[1:], 16)
-        return entities
+        from mathmlbibdesk import ENTITIES
+        return ENTITIES
 
     def parse_at_url(self, url):
-        """Helper method to read data from URL, and passes on to parse()."""
+        """Helper method to open URL, and pass the stream on to parse()."""
         try:
-            html_data = urllib2.urlopen(url).read()
+            self.parse(httpbibdesk.urlopen(url))
         except urllib2.URLError, err:
             logging.debug("ADSHTMLParser timed out on URL: %s", url)
             raise ADSException(err)
-        self.parse(html_data)
 
     def parse(self, html_data):
         """
         Feed url into our own HTMLParser and parse found bibtex
 
-        html_data is a string containing HTML data from ADS page.
+        html_data is a string containing HTML data from ADS page, or a
+        file-like object read by feed_stream().
         """
-        #logging.debug(html_data)
-        #logging.debug(self.links)
-        self.feed(html_data)
-        #logging.debug(self.links)
+        if isinstance(html_data, basestring):
+            self.feed(html_data)
+        else:
+            self.feed_stream(html_data)
         logging.debug("ADSHTMLParser found links: %s",
                       pprint.pformat(self.links))
 
@@ -1367,30 +2344,62 @@ class ADSHTMLParser(HTMLParser):
                     {'adscomment': '"' + self.comment.replace('"', "'") + '"'})
             # construct ArXivURL from arXiv identifier
             if self.arxivid:
-                if 'arxiv_mirror' not in self.prefs \
-                        or not self.prefs['arxiv_mirror']:
-                    # test HTTP redirect to get the arXiv mirror used by ADS
-                    try:
-                        mirror = urlparse.urlsplit(
-                            get_redirect(self.links['preprint'])).netloc
-                    except KeyError:
-                        mirror = 'arxiv.org'  # this should not happen
-                else:
-                    mirror = self.prefs['arxiv_mirror']
                 url = urlparse.urlunsplit((
-                    'http', mirror,
+                    'http', get_mirror(self.prefs, 'arxiv'),
                     'abs/' + self.arxivid, None, None))
                 self.bibtex.info.update({'arxivurl': '"' + url + '"'})
 
+    @property
+    def complete(self):
+        """True once the bibtex link and the abstract have been read. The
+        comment and arXiv identifier come before the abstract in ADS pages,
+        so the rest of the page is not needed."""
+        return self.abstract is not None and 'bibtex' in self.links
+
+    def feed_stream(self, stream):
+        """Feed the ADS page read from `stream` chunk by chunk, skipping
+        its <head>, and close it as soon as the page is `complete`."""
+        head = ''
+        rest = []
+        try:
+            while not self.complete:
+                chunk = stream.read(self.chunk_size)
+                if head is not None:
+                    # hold back the data until the end of <head>
+                    head += chunk
+                    match = self.head_pattern.search(head)
+                    if match:
+                        chunk = head[:match.start()] + head[match.end():]
+                    elif chunk and '<body' not in head.lower():
+                        continue
+                    else:
+                        chunk = head
+                    head = None
+                if not chunk:
+                    self.feed(''.join(rest))
+                    break
+                # feed up to the end of the last tag, so that text is not
+                # split across handle_data() calls
+                end = chunk.rfind('>') + 1
+                if not end:
+                    rest.append(chunk)
+                    continue
+                rest.append(chunk[:end])
+                self.feed(''.join(rest))
+                rest = [chunk[end:]]
+        finally:
+            stream.close()
+
     def handle_starttag(self, tag, attrs):
         if tag.lower() == 'hr' and self.get_abs:
             # abstract
-            self.abstract = self.tag.strip().decode('utf-8')
+            self.abstract = ''.join(self.tag).strip().decode('utf-8')
             self.get_abs = False
-            self.tag = ''
+            del self.tag[:]
         elif tag.lower() == 'img' and self.get_abs:
             # handle old scanned articles abstracts
-            self.tag += dict(attrs)['src'].replace('&#38;', unichr(38))
+            self.tag.append(
+                dict(attrs)['src'].replace('&#38;', unichr(38)))
         elif tag.lower() == 'a':
             # links
             if 'href' in dict(attrs):
@@ -1408,51 +2417,65 @@ class ADSHTMLParser(HTMLParser):
 
     def handle_endtag(self, tag):
         if self.get_comment and tag.lower() == 'td':
-            self.comment = self.tag.strip().decode('utf-8')
+            self.comment = ''.join(self.tag).strip().decode('utf-8')
             self.get_comment = None
-            self.tag = ''
+            del self.tag[:]
 
     def handle_data(self, data):
         if self.get_abs:
-            self.tag += data.replace('\n', ' ')
+            self.tag.append(data.replace('\n', ' '))
         if self.get_comment:
-            self.tag += data
+            self.tag.append(data)
 
+        stripped = data.strip()
         # beginning of abstract found
-        if data.strip() == 'Abstract':
+        if stripped == 'Abstract':
             self.get_abs = True
-        if data.strip() == 'Comment:':
+        if stripped == 'Comment:':
             self.get_comment = False
         # store arXiv identifier
-        # FIXME perhaps compile this regular expression as a global?
-        if re.search('arXiv:(\d{4,6}.\d{4,6}|astro\-ph/\d{7})', data) \
-                is not None:
-            self.arxivid = re.search(
-                'arXiv:(\d{4,6}.\d{4,6}|astro\-ph/\d{7})',
-                data).group(1)
+        match = self.arxiv_pattern.search(data)
+        if match is not None:
+            self.arxivid = match.group(1)
 
     # handle html entities
     def handle_entityref(self, name):
         if self.get_abs:
             if name in name2codepoint:
                 c = name2codepoint[name]
-                self.tag += unichr(c).encode('utf-8')
+                self.tag.append(unichr(c).encode('utf-8'))
             else:
-                # fetch mathml
+                # bundled mathml table
                 if not self.entities:
-                    # cache dict
                     self.entities = self.mathml()
                 if name in self.entities:
+                    # \U escape also works for astral planes (e.g. &Afr;)
+                    # on narrow Python builds, unlike unichr()
                     c = self.entities[name]
-                    self.tag += unichr(c).encode('utf-8')
+                    self.tag.append(('\\U%08x' % c).decode(
+                        'unicode-escape').encode('utf-8'))
                 else:
                     # nothing worked, leave it as-is
-                    self.tag += '&' + name + ';'
+                    self.tag.append('&' + name + ';')
 
     # handle unicode chars in utf-8
     def handle_charref(self, name):
         if self.get_abs:
-            self.tag += unichr(int(name)).encode('utf-8')
+            self.tag.append(unichr(int(name)).encode('utf-8'))
+
+    def download(self, url, pdf):
+        """Stream the PDF at `url` to the file `pdf`, within the max_pdf_size
+        (MB) preference"""
+        max_size = self.prefs.get('max_pdf_size')
+        try:
+            httpbibdesk.download(
+                url, pdf, max_size=max_size and max_size * 2 ** 20)
+        except urllib2.HTTPError:
+            raise
+        except urllib2.URLError:
+            report_mirror(self.prefs, url, False)
+            raise
+        report_mirror(self.prefs, url, True)
 
     def get_pdf(self):
         """
@@ -1503,9 +2526,10 @@ class ADSHTMLParser(HTMLParser):
 
             # try locally
             fd, pdf = tempfile.mkstemp(suffix='.pdf')
+            os.close(fd)
             # test for HTTP auth need
             try:
-                os.fdopen(fd, 'wb').write(urllib2.urlopen(pdf_url).read())
+                self.download(pdf_url, pdf)
             except urllib2.URLError, err:  # HTTPError derives from URLError
                 logging.debug('%s failed: %s' % (pdf_url, err))
                 # dummy file
@@ -1538,8 +2562,8 @@ class ADSHTMLParser(HTMLParser):
             print 'confnote URL', url
             # get CDS PDF
             fd, pdf = tempfile.mkstemp(suffix='.pdf')
-            os.fdopen(fd, 'wb').write(urllib2.urlopen(
-                url).read())
+            os.close(fd)
+            self.download(url, pdf)
             if 'PDF document' in filetype(pdf):
                 print pdf
                 return pdf
@@ -1555,13 +2579,8 @@ class ADSHTMLParser(HTMLParser):
 
             # fetch PDF directly without parsing the arXiv page
             if self.arxivid is not None:
-                # user defined mirror?
-                if 'arxiv_mirror' not in self.prefs \
-                        or not self.prefs['arxiv_mirror']:
-                    # test HTTP redirect to get the arXiv mirror used by ADS
-                    mirror = urlparse.urlsplit(get_redirect(url)).netloc
-                else:
-                    mirror = self.prefs['arxiv_mirror']
+                # user defined or fastest mirror
+                mirror = get_mirror(self.prefs, 'arxiv')
                 url = urlparse.urlunsplit((
                     'http', mirror, 'pdf/' + self.arxivid, None, None))
                 logging.debug('arXiv PDF (%s)' % url)
@@ -1573,7 +2592,7 @@ class ADSHTMLParser(HTMLParser):
                 # search for PDF link in the arXiv page
                 # this should be *deprecated*
                 logging.debug('search for PDF link in the arXiv page : ( ')
-                for line in urllib2.urlopen(url):
+                for line in httpbibdesk.urlopen(url):
                     if '<h1><a href="/">' in line:
                         mirror = re.search(
                             '<h1><a href="/">(.*ar[xX]iv.org)',
@@ -1585,8 +2604,7 @@ class ADSHTMLParser(HTMLParser):
                             lower())
                         if DEBUG: print('1375 arXiv preprint URL:',url)
                         # use automatic mirror chosen by the ADS mirror
-                        if ('arxiv_mirror' not in self.prefs
-                                or not self.prefs['arxiv_mirror']) \
+                        if self.prefs['arxiv_mirror'] in (None, 'auto') \
                                 and mirror is not None:
                             url = urlparse.urlunsplit((
                                 url.scheme,
@@ -1594,7 +2612,7 @@ class ADSHTMLParser(HTMLParser):
                                 url.fragment))
                             if DEBUG: print('1384 arXiv preprint URL:',url)
                             break
-                        elif self.prefs['arxiv_mirror']:
+                        elif self.prefs['arxiv_mirror'] not in (None, 'auto'):
                             url = urlparse.urlunsplit((
                                 url.scheme,
                                 self.prefs['arxiv_mirror'],
@@ -1615,8 +2633,8 @@ class ADSHTMLParser(HTMLParser):
             logging.debug('PDF about to be downloaded')
 
             fd, pdf = tempfile.mkstemp(suffix='.pdf')
-            os.fdopen(fd, 'wb').write(urllib2.urlopen(
-                url.replace('abs', 'pdf')).read())
+            os.close(fd)
+            self.download(url.replace('abs', 'pdf'), pdf)
             logging.debug('PDF was downloaded')
 
             if 'PDF document' in filetype(pdf):
@@ -1629,8 +2647,7 @@ class ADSHTMLParser(HTMLParser):
                     notify('Waiting for arXiv...', '',
                            'PDF is being generated, retrying in 30s...')
                     time.sleep(30)
-                    open(pdf, 'wb').write(urllib2.urlopen(
-                        url.replace('abs', 'pdf')).read())
+                    self.download(url.replace('abs', 'pdf'), pdf)
                 if 'PDF document' in filetype(pdf):
                     return pdf
                 else:
@@ -1649,6 +2666,38 @@ class ArXivException(Exception):
     pass
 
 
+ARXIV_NAMESPACES = {'Atom': 'http://www.w3.org/2005/Atom',
+                    'atom': 'http://arxiv.org/schemas/atom'}
+
+# precompiled (Clark notation) paths into the arXiv API Atom feed
+ATOM_ENTRY = '{%(Atom)s}entry' % ARXIV_NAMESPACES
+ATOM_FIELDS = [(field, '{%s}%s' % (ARXIV_NAMESPACES['Atom'], field))
+               for field in ('id', 'title', 'updated', 'published', 'summary',
+                             'comment')]
+ATOM_AUTHOR_NAME = '{%(Atom)s}author/{%(Atom)s}name' % ARXIV_NAMESPACES
+ATOM_LINK = '{%(Atom)s}link' % ARXIV_NAMESPACES
+ATOM_PRIMARY_CATEGORY = '{%(atom)s}primary_category' % ARXIV_NAMESPACES
+
+
+def iter_atom_entries(stream):
+    """
+    Incrementally parse an arXiv API Atom feed read from the file-like
+    `stream`, so that the first entries are available before the whole
+    feed has been downloaded. Entries are dropped from the tree once
+    parsed.
+
+    :return: generator of `ArXivParser.parse_entry()` info dicts, one per
+        Atom:entry
+    """
+    from xml.etree import ElementTree
+    context = ElementTree.iterparse(stream, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event == 'end' and elem.tag == ATOM_ENTRY:
+            yield ArXivParser.parse_entry(elem)
+            root.clear()
+
+
 class ArXivParser(object):
 
     def __init__(self):
@@ -1665,20 +2714,22 @@ class ArXivParser(object):
         sets self.bib woth a string containign the bibtex info
         sets self.info via self.parseAPI
         """
-        from xml.etree import ElementTree
         self.url = 'http://export.arxiv.org/api/query?id_list=' + arxiv_id
         logging.debug('trying to get ' + self.url)
         try:
-            XMLstring = urllib2.urlopen(self.url).read()
-            logging.debug(XMLstring)
-            XMLtree = ElementTree.fromstring(XMLstring)
-            self.xml = XMLtree
-
+            stream = httpbibdesk.fetch_stream(self.url)
+            try:
+                self.info = next(iter_atom_entries(stream), None)
+                # read to the end, the response is only cached once complete
+                while stream.read(16384):
+                    pass
+            finally:
+                stream.close()
         except (urllib2.HTTPError, urllib2.URLError), err:
             logging.debug("ArXivParser failed on URL: %s", self.url)
             raise ArXivException(err)
-        logging.debug(  self.xml.find("id"))
-        self.info = self.parseAPI(self.xml)
+        if self.info is None:
+            raise ArXivException('no arXiv entry for %s' % arxiv_id)
         self.bibtex(self.info) # Creates the bibtex fields
         self.bib=self.__str__() # Creates the bibtex string
         logging.debug('bitex entry is \n '+self.bib)
@@ -1692,57 +2743,49 @@ class ArXivParser(object):
             'id','title','updated','published','summary','comment'
         plus a dict-valued entry `info['author']`, `info['link']`, `info['primary_category']`
         """
-        namespaces = {'Atom': 'http://www.w3.org/2005/Atom','atom':'http://arxiv.org/schemas/atom'}
-        info={}
-
         for child in xml:
             print( 'tag: ', child.tag, ' attrib: ', child.attrib, child.getchildren() )
 
         #print( XMLtree.find('Atom:entry',namespaces).getchildren()  )
         logging.debug('Trying to get some data from the entry')
-        entry= xml.find('Atom:entry',namespaces)
+        entry= xml.find('Atom:entry',ARXIV_NAMESPACES)
 
         def printXMLentry(entry):
             for child in entry:
                 print( 'tag: ', child.tag, ' attrib: ', child.attrib, child.getchildren() )
 
         printXMLentry(entry)
-        # Get fields directly filed as sub-tag values in the entry tag
-        entry_fields=['id','title','updated','published','summary','comment']
-        for _id in entry_fields:
-            __id=xml.find('Atom:entry/Atom:'+_id,namespaces)
-            logging.debug( __id )
-            if __id is not None:
-                if _id == 'title':
-                    info[_id]='{'+__id.text+'}'
-                else:
-                    info[_id]=__id.text
-            else:
-                info[_id]=''
-        # Authos into a list of dictionaries
-        def AddSubtab(info,tag='author',subtag='name'):
-            Xauthor = xml.findall('Atom:entry/Atom:'+tag+'/Atom:'+subtag+'',namespaces)
-            authors = [ {subtag:author.text} for author in Xauthor ]
-            #print(authors)
-            info['author']=authors
-
-        AddSubtab(info,tag='author',subtag='name')
-        logging.debug(info['author'])
-
-        # find the primary category and turn it into a dictioanry
-        primary_category=xml.findall('Atom:entry/atom:primary_category',namespaces)
-        info['primary_category'] = [ { attrib:pc.attrib[attrib] for attrib in ['term'] } for pc in primary_category ]
-
-        # find by tag 'type': 'application/pdf' the link to the PDF
-        pdf_link=xml.findall("Atom:entry/Atom:link[@type='application/pdf']",namespaces)
-
-        for l in pdf_link:
-            print(l.attrib['href'])
-        #links = [ l.attrib['href'] for l in link ]
-        info['link'] = [ { attrib:l.attrib[attrib] for attrib in ['href','title','rel','type'] } for l in pdf_link ]
-        #info['link'] =
+        return self.parse_entry(entry)
 
+    @staticmethod
+    def parse_entry(entry):
+        """
+        Same as `parseAPI`, for a single `Atom:entry` element of the feed
+        """
+        info = {}
 
+        # Get fields directly filed as sub-tag values in the entry tag
+        for field, tag in ATOM_FIELDS:
+            elem = entry.find(tag)
+            if elem is None:
+                info[field] = ''
+            elif field == 'title':
+                info[field] = '{' + elem.text + '}'
+            else:
+                info[field] = elem.text
+        # Authors into a list of dictionaries
+        info['author'] = [{'name': author.text}
+                          for author in entry.iterfind(ATOM_AUTHOR_NAME)]
+        # the primary category as a dictionary
+        info['primary_category'] = [
+            {'term': pc.attrib['term']}
+            for pc in entry.iterfind(ATOM_PRIMARY_CATEGORY)]
+        # the link to the PDF, by type 'application/pdf'
+        info['link'] = [
+            dict((attrib, l.attrib[attrib])
+                 for attrib in ['href', 'title', 'rel', 'type'])
+            for l in entry.iterfind(ATOM_LINK)
+            if l.get('type') == 'application/pdf']
         return info
 
     def parse(self, xml):
@@ -1822,14 +2865,73 @@ class ArXivParser(object):
     def __str__(self):
         import string
         logging.debug(self.__dict__)
-        return '@article{%s,\n' % self.Eprint +\
-            '\n'.join([
-                '%s = {%s},' % (k, v)
-                for k, v in
-                sorted([(k, v.decode('utf-8'))
-                        for k, v in self.__dict__.iteritems()
-                        if k[0] in string.uppercase])]) +\
-            '}'
+        return bibtexbibdesk.format_entry('article', self.Eprint, [
+            (k, bibtexbibdesk.braced(v))
+            for k, v in sorted([(k, v.decode('utf-8'))
+                                for k, v in self.__dict__.iteritems()
+                                if k[0] in string.uppercase])])
+
+
+def resolve_arxiv_batch(arxiv_ids, chunk_size=50):
+    """
+    Resolve many arXiv identifiers with one arXiv API request per chunk of
+    `chunk_size` identifiers.
+
+    :return: dict of requested arXiv ID -> `ArXivParser` (with `info` and
+        `bib` set, as after `ArXivParser.parse_at_id`); IDs that could not
+        be resolved are left out
+    """
+    arxiv_ids = sorted(set(arxiv_ids))
+    parsers = {}
+    for start in range(0, len(arxiv_ids), chunk_size):
+        chunk = arxiv_ids[start:start + chunk_size]
+        url = 'http://export.arxiv.org/api/query?id_list=%s&max_results=%i' \
+            % (','.join(chunk), len(chunk))
+        logging.debug('trying to get ' + url)
+        try:
+            stream = httpbibdesk.fetch_stream(url)
+        except (urllib2.HTTPError, urllib2.URLError), err:
+            logging.debug("arXiv batch failed on URL %s: %s", url, err)
+            continue
+        try:
+            _resolve_atom_entries(stream, url, parsers)
+        except (urllib2.URLError, socket.error, SyntaxError), err:
+            # entries read before the failure are kept
+            logging.debug("arXiv batch failed on URL %s: %s", url, err)
+        finally:
+            stream.close()
+    resolved = {}
+    for arxiv_id in arxiv_ids:
+        # entries are keyed by canonical ID, as the feed may spell it
+        # differently, e.g. without the subject class of math.GT/0309136
+        parser = parsers.get(identbibdesk.Identifier('arxiv',
+                                                     arxiv_id).versioned)
+        if parser is not None:
+            resolved[arxiv_id] = parser
+    return resolved
+
+
+def _resolve_atom_entries(stream, url, parsers):
+    """Add an `ArXivParser` for every entry of the feed `stream` to
+    `parsers`, by canonical arXiv ID with and without version, see
+    resolve_arxiv_batch()"""
+    for info in iter_atom_entries(stream):
+        arxiv_bib = ArXivParser()
+        arxiv_bib.url = url
+        arxiv_bib.info = info
+        try:
+            arxiv_bib.bibtex(arxiv_bib.info)
+        except (KeyError, IndexError, ValueError, AttributeError,
+                TypeError), err:
+            # e.g. the error entry for a malformed ID
+            logging.debug("skipping arXiv entry %s: %s",
+                          arxiv_bib.info['id'], err)
+            continue
+        arxiv_bib.bib = arxiv_bib.__str__()
+        # match both versioned and unversioned requests
+        ident = identbibdesk.Identifier('arxiv', arxiv_bib.Eprint)
+        parsers[ident.versioned] = arxiv_bib
+        parsers.setdefault(ident.id, arxiv_bib)
 
 
 class MNRASException(Exception):
@@ -1854,7 +2956,7 @@ class MNRASParser(HTMLParser):
         try:
             # Detect and decode page's charset
             logging.debug("Parsing MNRAS url %s" % url)
-            connection = urllib2.urlopen(url)
+            connection = httpbibdesk.urlopen(url)
             encoding = connection.headers.getparam('charset')
             if encoding is not None:
                 logging.debug("Detected MNRAS encoding %s" % encoding)
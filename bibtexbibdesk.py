@@ -0,0 +1,412 @@
+"""
+ADS to BibDesk -- frictionless import of ADS publications into BibDesk
+Copyright (C) 2014  Rui Pereira <rui.pereira@gmail.com> and
+                    Jonathan Sick <jonathansick@mac.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+BibTeX reader and writer shared by arxivbibdesk and cdsbibdesk.
+
+`iterparse()` tokenizes BibTeX text in a single pass, yielding one `Entry`
+at a time. Values may contain nested braces, quotes, commas and newlines,
+and be `#` concatenations of strings and `@string` macros.
+
+Entries keep their fields in order, with the raw values as written in the
+source (including their delimiters), so that they are emitted again
+unchanged by `format_entry()`. `expand()` gives the actual text of a value.
+
+Whole libraries are read with `iterread()`, which only holds one entry (and
+one chunk of the file) in memory at a time, optionally keeping only some
+fields, and written back one entry at a time with `BibWriter`.
+"""
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+
+# BibTeX predefined month macros
+MONTHS = dict((m[:3].lower(), m) for m in (
+    'January', 'February', 'March', 'April', 'May', 'June', 'July',
+    'August', 'September', 'October', 'November', 'December'))
+
+_ENTRY = re.compile(r'@\s*([A-Za-z]\w*)\s*([{(])')
+_KEY = re.compile(r'\s*([^\s,{}()=]*)\s*([,})])')
+_NAME = re.compile(r'[\s,]*([^\s=,{}()"#]+)\s*=\s*')
+_WORD = re.compile(r'[^\s,#{}()"=]+')
+_SPACE = re.compile(r'\s*')
+_BRACES = re.compile(r'[{}]')
+_QUOTES = re.compile(r'[{}"]')
+_PARENS = re.compile(r'[{}()]')
+
+# bytes read at a time by iterread()
+CHUNK_SIZE = 2 ** 16
+# iterread() gives up on entries still unterminated after this many bytes
+MAX_ENTRY_SIZE = 2 ** 20
+
+
+class BibTexException(Exception):
+    pass
+
+
+class Entry(object):
+    """A BibTeX entry: `type`, citation `key` and ordered `fields`, a dict of
+    lower case field name -> raw value"""
+
+    __slots__ = ('type', 'key', 'fields', 'strings')
+
+    def __init__(self, type, key, fields=(), strings=None):
+        self.type = type
+        self.key = key
+        self.fields = OrderedDict(fields)
+        # @string macros known when the entry was read
+        self.strings = strings
+
+    def __contains__(self, name):
+        return name.lower() in self.fields
+
+    def __getitem__(self, name):
+        return self.fields[name.lower()]
+
+    def __setitem__(self, name, value):
+        self.fields[name.lower()] = value
+
+    def get(self, name, default=None):
+        """:return: the expanded text of field `name`, or `default`"""
+        raw = self.fields.get(name.lower())
+        if raw is None:
+            return default
+        return expand(raw, self.strings)
+
+    def __str__(self):
+        return format_entry(self.type, self.key, self.fields.iteritems())
+
+    def __repr__(self):
+        return '<Entry @%s{%s}>' % (self.type, self.key)
+
+
+def iterparse(text, strings=None, fields=None):
+    """
+    Parse BibTeX `text` one entry at a time
+
+    :param text: BibTeX source
+    :param strings: dict of macros, updated by @string definitions
+        (defaults to the month names)
+    :param fields: names of the fields to keep, or None for all of them
+    :return: generator of `Entry`; @comment and @preamble are skipped, and
+        so are malformed entries
+    """
+    if fields is not None:
+        fields = frozenset(name.lower() for name in fields)
+    if strings is None:
+        strings = dict(MONTHS)
+    pos = 0
+    while True:
+        match = _ENTRY.search(text, pos)
+        if match is None:
+            return
+        kind = match.group(1).lower()
+        close = '}' if match.group(2) == '{' else ')'
+        try:
+            if kind == 'comment':
+                if close == '}':
+                    pos = _braces_end(text, match.end() - 1)
+                else:
+                    pos = text.index(')', match.end()) + 1
+                continue
+            elif kind == 'preamble':
+                pos = _value_end(text, _SPACE.match(text, match.end()).end())
+                pos = _SPACE.match(text, pos).end()
+                if not text.startswith(close, pos):
+                    raise BibTexException('unterminated @preamble')
+                pos += 1
+                continue
+            elif kind == 'string':
+                macros, pos = _parse_fields(text, match.end(), close)
+                for name, raw in macros:
+                    strings[name] = expand(raw, strings)
+                continue
+            key = _KEY.match(text, match.end())
+            if key is None:
+                raise BibTexException('no citation key')
+            if key.group(2) == close:
+                values, pos = [], key.end()
+            else:
+                values, pos = _parse_fields(text, key.end(), close, fields)
+        except (BibTexException, ValueError), err:
+            logging.debug('skipping BibTeX entry at %i: %s',
+                          match.start(), err)
+            pos = match.end()
+            continue
+        yield Entry(match.group(1), key.group(1), values, strings)
+
+
+def iterread(path, fields=None, strings=None, chunk_size=CHUNK_SIZE,
+             max_entry_size=MAX_ENTRY_SIZE):
+    """
+    Read the .bib file at `path` one entry at a time, in bounded memory
+
+    An entry still unterminated after `max_entry_size` bytes (e.g. a missing
+    closing brace) is skipped, up to the next @ at the start of a line.
+
+    :param fields: names of the fields to keep, or None for all of them
+    :param strings: dict of macros, updated by @string definitions
+    :return: generator of `Entry`, as `iterparse()`
+    """
+    if strings is None:
+        strings = dict(MONTHS)
+    with open(path) as bib:
+        buf = ''
+        pos = 0
+        eof = False
+        skipping = False
+        while True:
+            if skipping:
+                at = buf.find('\n@', pos)
+                if at >= 0:
+                    pos = at + 1
+                    skipping = False
+                    continue
+                # keep the last newline, the next entry may follow it
+                pos = max(pos, len(buf) - 1)
+            else:
+                match = _ENTRY.search(buf, pos)
+                end = None
+                if match is not None:
+                    try:
+                        end = _entry_end(buf, match)
+                    except BibTexException:
+                        if eof:
+                            # never closed, skip it
+                            logging.debug(
+                                'skipping unterminated BibTeX entry')
+                            pos = match.end()
+                            continue
+                        if len(buf) - match.start() > max_entry_size:
+                            logging.debug('skipping BibTeX entry still '
+                                          'unterminated after %i bytes',
+                                          len(buf) - match.start())
+                            pos = match.end()
+                            skipping = True
+                            continue
+                if end is not None:
+                    for entry in iterparse(buf[match.start():end], strings,
+                                           fields):
+                        yield entry
+                    pos = end
+                    continue
+                # keep the start of a possibly incomplete entry, read more
+                if match is None:
+                    at = buf.rfind('@', pos)
+                    pos = at if at >= 0 else len(buf)
+                else:
+                    pos = match.start()
+            if eof:
+                return
+            chunk = bib.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+class BibWriter(object):
+    """Writes a .bib file one entry at a time.
+
+    Entries go to a temporary file next to `path`, which only replaces
+    `path` once the writer is closed, so that an interrupted run never
+    leaves a truncated library behind. Use as a context manager, or call
+    `close()` (or `abort()`) explicitly.
+    """
+
+    def __init__(self, path, strings=None):
+        self.path = path
+        fd, self._tmp = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix='.bib')
+        self._file = os.fdopen(fd, 'w')
+        # macros are defined first, leaving out the predefined months
+        for name, value in sorted((strings or {}).iteritems()):
+            if MONTHS.get(name) != value:
+                self._file.write('@string{%s = %s}\n\n' %
+                                 (name, braced(value)))
+
+    def write(self, entry):
+        """Append `entry`, an `Entry` or BibTeX string"""
+        self._file.write('%s\n\n' % entry)
+
+    def close(self):
+        """Finish writing and replace `path`"""
+        if self._file.closed:
+            return
+        self._file.close()
+        if os.path.exists(self.path):
+            shutil.copymode(self.path, self._tmp)
+        os.rename(self._tmp, self.path)
+
+    def abort(self):
+        """Drop everything written, leaving `path` untouched"""
+        if self._file.closed:
+            return
+        self._file.close()
+        os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def parse(text, strings=None):
+    """:return: list of the `Entry` in BibTeX `text`"""
+    return list(iterparse(text, strings))
+
+
+def parse_entry(text, strings=None):
+    """:return: the first `Entry` in BibTeX `text`"""
+    for entry in iterparse(text, strings):
+        return entry
+    raise BibTexException('no BibTeX entry found')
+
+
+def expand(raw, strings=None):
+    """:return: text of the raw BibTeX value `raw`, without its delimiters
+    and with macros and # concatenations resolved"""
+    if strings is None:
+        strings = MONTHS
+    pieces = []
+    pos = 0
+    while pos < len(raw):
+        char = raw[pos]
+        if char == '{':
+            end = _braces_end(raw, pos)
+            pieces.append(raw[pos + 1:end - 1])
+        elif char == '"':
+            end = _quotes_end(raw, pos)
+            pieces.append(raw[pos + 1:end - 1])
+        else:
+            match = _WORD.match(raw, pos)
+            if match is None:
+                raise BibTexException('bad value %r' % raw)
+            end = match.end()
+            word = match.group()
+            pieces.append(strings.get(word.lower(), word))
+        pos = _SPACE.match(raw, end).end()
+        if raw.startswith('#', pos):
+            pos = _SPACE.match(raw, pos + 1).end()
+    return ''.join(pieces)
+
+
+def braced(value):
+    """:return: `value` as a raw BibTeX value, delimited by braces"""
+    return '{%s}' % value
+
+
+def format_entry(entry_type, key, fields):
+    """
+    BibTeX source of an entry
+
+    :param fields: (name, raw value) pairs, in order
+    """
+    return '@%s{%s,\n%s\n}' % (entry_type, key, ',\n'.join(
+        ['  %s = %s' % field for field in fields]))
+
+
+def _parse_fields(text, pos, close, keep=None):
+    """:return: list of (name, raw value) up to the `close` delimiter of the
+    entry, and the position after it. Only fields in `keep` are returned,
+    if given."""
+    fields = []
+    while True:
+        match = _NAME.match(text, pos)
+        if match is None:
+            pos = _SPACE.match(text, pos).end()
+            while text.startswith(',', pos):
+                pos = _SPACE.match(text, pos + 1).end()
+            if text.startswith(close, pos):
+                return fields, pos + 1
+            raise BibTexException('field name expected at %i' % pos)
+        start = match.end()
+        pos = _value_end(text, start)
+        name = match.group(1).lower()
+        if keep is None or name in keep:
+            fields.append((name, text[start:pos]))
+
+
+def _value_end(text, pos):
+    """:return: the end of the raw value starting at `pos`"""
+    while True:
+        char = text[pos:pos + 1]
+        if char == '{':
+            pos = _braces_end(text, pos)
+        elif char == '"':
+            pos = _quotes_end(text, pos)
+        else:
+            match = _WORD.match(text, pos)
+            if match is None:
+                raise BibTexException('value expected at %i' % pos)
+            pos = match.end()
+        end = pos
+        pos = _SPACE.match(text, pos).end()
+        if not text.startswith('#', pos):
+            return end
+        pos = _SPACE.match(text, pos + 1).end()
+
+
+def _entry_end(text, match):
+    """:return: the position after the entry opened by the `_ENTRY`
+    `match`"""
+    if match.group(2) == '{':
+        return _braces_end(text, match.end() - 1)
+    depth = 0
+    for paren in _PARENS.finditer(text, match.end()):
+        char = paren.group()
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == ')' and not depth:
+            return paren.end()
+    raise BibTexException('unbalanced parentheses at %i' % match.start())
+
+
+def _braces_end(text, pos):
+    """:return: the position after the brace matching the one at `pos`"""
+    depth = 0
+    for match in _BRACES.finditer(text, pos):
+        if match.group() == '{':
+            depth += 1
+        else:
+            depth -= 1
+            if not depth:
+                return match.end()
+    raise BibTexException('unbalanced braces at %i' % pos)
+
+
+def _quotes_end(text, pos):
+    """:return: the position after the quote closing the one at `pos`,
+    ignoring quotes within braces"""
+    depth = 0
+    for match in _QUOTES.finditer(text, pos + 1):
+        char = match.group()
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif not depth:
+            return match.end()
+    raise BibTexException('unterminated quote at %i' % pos)
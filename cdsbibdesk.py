@@ -30,6 +30,7 @@ import datetime
 import difflib
 import fnmatch
 import glob
+import json
 import logging
 import math
 import optparse
@@ -44,6 +45,7 @@ import time
 # cgi.parse_qs is deprecated since 2.6
 # but OS X 10.5 only has 2.5
 import cgi
+import urllib
 import urllib2
 import urlparse
 #from lxml import etree as ET
@@ -79,120 +81,238 @@ except ImportError:
 from HTMLParser import HTMLParser, HTMLParseError
 from htmlentitydefs import name2codepoint
 
+import bibtexbibdesk
+import httpbibdesk
+import identbibdesk
+
+# CDS search for report numbers, as MARCXML (query, number of records)
+CDS_SEARCH_URL = 'https://cds.cern.ch/search?ln=en&p=%s&action_search=Search&op1=a&m1=a&p1=&f1=&c=CERN+Document+Server&sf=&so=d&rm=&rg=%i&sc=1&of=xm'
+CDS_RECORD_URL = 'https://cds.cern.ch/record/'
+
+# Inspire literature REST API, and the only fields InspireParser needs
+INSPIRE_API_URL = 'https://inspirehep.net/api/literature'
+INSPIRE_RECORD_URL = 'https://inspirehep.net/record/'
+INSPIRE_FIELDS = ['control_number', 'titles.title', 'authors.full_name',
+                  'abstracts.value', 'arxiv_eprints.value', 'dois.value',
+                  'publication_info.journal_title',
+                  'publication_info.journal_volume',
+                  'publication_info.journal_issue',
+                  'publication_info.page_start', 'publication_info.page_end',
+                  'publication_info.artid', 'publication_info.year',
+                  'documents.url', 'documents.fulltext']
+
+class MarcRecord(object):
+    """MARCXML record indexed by tag and subfield code.
+
+    The record is walked once, so that the `find_*_in_xml` helpers below
+    are dictionary lookups instead of searches over the whole tree.
+
+    :param xml: ElementTree element of the record
+    """
+
+    def __init__(self, xml):
+        self.controlfields = {}  # tag -> text
+        self.datafields = {}  # tag -> list of {code: [texts]}
+        self.subfields = {}  # (tag, code) -> [texts], in document order
+        for field in xml.iter():
+            tag = field.get('tag')
+            if tag is None:
+                continue
+            if not len(field):
+                self.controlfields.setdefault(tag, field.text)
+                continue
+            codes = {}
+            for subfield in field:
+                code = subfield.get('code')
+                if code is not None:
+                    codes.setdefault(code, []).append(subfield.text)
+                    self.subfields.setdefault((tag, code), []).append(
+                        subfield.text)
+            self.datafields.setdefault(tag, []).append(codes)
+
+    def controlfield(self, tag, default=None):
+        """:return: text of the `tag` controlfield"""
+        return self.controlfields.get(tag, default)
+
+    def first(self, tag, code, default=None):
+        """:return: text of the first `tag`/`code` subfield"""
+        texts = self.subfields.get((tag, code))
+        return texts[0] if texts else default
+
+    def all(self, tag, code):
+        """:return: texts of every `tag`/`code` subfield"""
+        return self.subfields.get((tag, code), [])
+
+    def fields(self, tag):
+        """:return: list of the `tag` datafields, as {code: [texts]}"""
+        return self.datafields.get(tag, [])
+
+    def has(self, tag, code):
+        return (tag, code) in self.subfields
+
+
+def marc_record(xml):
+    """:return: `xml` as a `MarcRecord`, indexing it if needed"""
+    if isinstance(xml, MarcRecord):
+        return xml
+    return MarcRecord(xml)
+
+
+def split_collection(xml):
+    """:return: list of `MarcRecord`, one per <record> of a MARCXML
+    <collection>"""
+    return [MarcRecord(record) for record in xml.iter()
+            if record.tag.split('}')[-1] == 'record']
+
+
+def find_report_numbers_in_xml(xml):
+    """:return: upper case report numbers of the record, primary (037)
+    and additional (088) ones"""
+    record = marc_record(xml)
+    return [identbibdesk.canonical('report', number.strip())
+            for number in record.all('037', 'a') + record.all('088', 'a')
+            if number]
+
+
+def resolve_reports_batch(report_numbers, chunk_size=20):
+    """
+    Resolve many CERN report numbers with one CDS search per chunk of
+    `chunk_size` report numbers, OR'ed together.
+
+    A chunk whose search filled the page of results, or returned records
+    carrying none of the report numbers, is not trusted, and its report
+    numbers are left to single lookups.
+
+    :return: dict of upper case report number -> `CDSParser` (with `bib`
+        and `ads_url` set, as after `CDSParser.parse_at_id`); report
+        numbers that could not be resolved are left out
+    """
+    from xml.etree import ElementTree
+    wanted = sorted(set(identbibdesk.canonical('report', number)
+                        for number in report_numbers))
+    parsers = {}
+    for start in range(0, len(wanted), chunk_size):
+        chunk = wanted[start:start + chunk_size]
+        # Invenio boolean operators are upper case
+        query = ' OR '.join('reportnumber:"%s"' % number for number in chunk)
+        # room for records sharing a report number
+        size = 2 * len(chunk)
+        url = CDS_SEARCH_URL % (urllib.quote(query), size)
+        logging.debug('trying to get ' + url)
+        try:
+            xml = ElementTree.fromstring(httpbibdesk.fetch(url))
+        except (urllib2.HTTPError, urllib2.URLError, SyntaxError), err:
+            logging.debug("CDS batch failed on URL %s: %s", url, err)
+            continue
+        records = split_collection(xml)
+        found = [[number for number in find_report_numbers_in_xml(record)
+                  if number in chunk] for record in records]
+        if len(records) >= size or not all(found):
+            logging.debug("CDS batch returned %i records for %i report "
+                          "numbers, not used: %s", len(records), len(chunk),
+                          url)
+            continue
+        for record, numbers in zip(records, found):
+            numbers = [number for number in numbers if number not in parsers]
+            if not numbers or find_recid_in_xml(record) is None:
+                continue
+            cds_entry = CDSParser()
+            cds_entry.url = url
+            cds_entry.parse_record(record)
+            for number in numbers:
+                parsers[number] = cds_entry
+    return parsers
+
+
 def find_recid_in_xml(xml):
-    recid = xml.find(".//*[@tag='001']").text
+    recid = marc_record(xml).controlfield('001')
     logging.debug(' Found RECID %s ' % recid)
     return recid
 
 def find_pdf_in_xml(xml):
-
-    for pdfurl in xml.findall(".//*[@tag='856']"):
-        if pdfurl.find("./*[@code='y']") is not None:
-            if "Fulltext" in pdfurl.find("./*[@code='y']").text:
-                for found in pdfurl.findall("./*[@code='u']"):
-                    if ".pdf" in found.text:
-                        return found.text
-    for pdfurl in xml.findall(".//*[@tag='856']/*[@code='u']"):
-        if ".pdf" in pdfurl.text:
-            return pdfurl.text
+    record = marc_record(xml)
+    for pdfurl in record.fields('856'):
+        if 'y' in pdfurl:
+            if "Fulltext" in (pdfurl['y'][0] or ''):
+                for found in pdfurl.get('u', []):
+                    if ".pdf" in found:
+                        return found
+    for pdfurl in record.all('856', 'u'):
+        if ".pdf" in pdfurl:
+            return pdfurl
     return ''
 
 
 def find_title_in_xml(xml):
-    return xml.find(".//*[@tag='245']/*[@code='a']").text
+    return marc_record(xml).first('245', 'a', '')
 
 
 def find_journal_in_xml(xml):
-    try:
-        journal = xml.find(".//*[@tag='773']/*[@code='p']").text
-        return journal
-    except AttributeError:
-        try:
-            journal = xml.find(".//*[@tag='037']/*[@code='a']").text
-            return journal
-        except AttributeError:
-            return ''
+    record = marc_record(xml)
+    if record.has('773', 'p'):
+        return record.first('773', 'p')
+    return record.first('037', 'a', '')
 
 def find_DOI_in_xml(xml):
-    try:
-        res =  xml.find(".//*[@tag='024']/*[@code='a']").text
-        logging.debug('DOI %s' % res)
-        return res
-    except AttributeError:
-        return ''
+    res = marc_record(xml).first('024', 'a', '')
+    logging.debug('DOI %s' % res)
+    return res
 
 def find_pages_in_xml(xml):
-    try:
-        res = xml.find(".//*[@tag='773']/*[@code='c']").text
-        return res
-    except AttributeError:
-        return ''
+    return marc_record(xml).first('773', 'c', '')
 
 def find_publication_volume_in_xml(xml):
-    try:
-        res = xml.find(".//*[@tag='773']/*[@code='v']").text
-        return res
-    except AttributeError:
-        return ''
+    return marc_record(xml).first('773', 'v', '')
 
 def find_publication_volume_number_in_xml(xml):
-    try:
-        res = xml.find(".//*[@tag='773']/*[@code='n']").text
-        return res
-    except AttributeError:
-        return ''
+    return marc_record(xml).first('773', 'n', '')
 
 def find_publication_year_in_xml(xml):
-    try:
-        res = xml.find(".//*[@tag='773']/*[@code='y']").text
-        return res
-    except AttributeError:
-        return ''
+    return marc_record(xml).first('773', 'y', '')
 
 def find_abstract_in_xml(xml):
-    return xml.find(".//*[@tag='520']/*[@code='a']").text
+    return marc_record(xml).first('520', 'a', '')
 
 
-def find_author_in_xml(xml):
-    def TeXify(first_author):
-        texified = '{%s}, %s' % (first_author.strip().split(',')[0],
-                   '~'.join(first_author.strip().split(',')[1:]))
-        return texified
+def TeXify(author):
+    """'Last, First' -> '{Last}, First'"""
+    texified = '{%s}, %s' % (author.strip().split(',')[0],
+               '~'.join(author.strip().split(',')[1:]))
+    return texified
+
 
-    first_author = xml.find(".//*[@tag='100']/*[@code='a']").text
+def find_author_in_xml(xml):
+    record = marc_record(xml)
+    first_author = record.first('100', 'a')
     formatted_first_author = TeXify(first_author)
 
     logging.debug('FIRST AUTHOR %s' % first_author)
     logging.debug( formatted_first_author )
-    further_authors = [ TeXify(_a.text) for _a in xml.findall(".//*[@tag='700']/*[@code='a']")]
+    further_authors = [TeXify(_a) for _a in record.all('700', 'a')]
 
     authors = [formatted_first_author]+further_authors
     authors_string = ' and '.join(authors)
     return authors_string
 
 def find_eprint_in_xml(xml):
-    try:
-        # go for the arXiv eprint
-        eprint = xml.find(".//*[@tag='037']/*[@code='a']").text
-        logging.debug("eprint found %s" % eprint)
-        return eprint
-    except:
-        try:
-            # go for Inspires eprint
-            eprint = xml.find(".//*[@tag='035']/*[@code='a']").text
+    record = marc_record(xml)
+    # go for the arXiv eprint, then for Inspires eprint
+    for tag in ('037', '035'):
+        if record.has(tag, 'a'):
+            eprint = record.first(tag, 'a')
             logging.debug("eprint found %s" % eprint)
             return eprint
-        except:
-            return find_recid_in_xml(self.xml)
+    return find_recid_in_xml(record)
 
 def find_how_many_authors_in_xml(xml):
-    return len(xml.findall(".//*[@tag='700']/*[@code='a']"))
+    return len(marc_record(xml).all('700', 'a'))
 
 def find_collaboration_in_xml(xml):
-    if xml.find(".//*[@tag='110']/*[@code='a']") is not None:
-        return xml.find(".//*[@tag='110']/*[@code='a']").text
-    if xml.find(".//*[@tag='710']/*[@code='g']") is not None:
-        return xml.find(".//*[@tag='710']/*[@code='g']").text
+    record = marc_record(xml)
+    if record.has('110', 'a'):
+        return record.first('110', 'a')
+    if record.has('710', 'g'):
+        return record.first('710', 'g')
 
 
 class CDSbibtex(object):
@@ -206,22 +326,19 @@ class CDSbibtex(object):
         pass
 
     def __str__(self):
-        import string
-        result='@article{%s,\n' % self.Eprint
-        result= result + 'eprint = \"%s\",\n' % self.Eprint
-        result= result + 'number = \"%s\",\n' % self.Eprint
-        result= result + 'title = \"{%s}\",\n' % self.Title
-        result= result + 'journal = \"{%s}\",\n' % self.Journal
-        result= result + 'volume = \"{%s}\",\n' % self.Volume
-        result= result + 'number = \"{%s}\",\n' % self.number
-        result= result + 'pages = \"{%s}\",\n' % self.Pages
-        result= result + 'year = \"{%s}\",\n' % self.Year
-        #result= result + 'collaboration = \"{%s}\",\n' % self.Author
-        result= result + 'author = \"{%s}\",\n' % self.Author
-        result= result + 'url = \"%s\",\n' % self.Url
-        result= result + 'doi = \"%s\",\n' % self.doi
-        result= result + '}'
-        return result
+        return bibtexbibdesk.format_entry('article', self.Eprint, [
+            ('eprint', '"%s"' % self.Eprint),
+            ('number', '"%s"' % self.Eprint),
+            ('title', '"{%s}"' % self.Title),
+            ('journal', '"{%s}"' % self.Journal),
+            ('volume', '"{%s}"' % self.Volume),
+            ('number', '"{%s}"' % self.number),
+            ('pages', '"{%s}"' % self.Pages),
+            ('year', '"{%s}"' % self.Year),
+            #('collaboration', '"{%s}"' % self.Author),
+            ('author', '"{%s}"' % self.Author),
+            ('url', '"%s"' % self.Url),
+            ('doi', '"%s"' % self.doi)])
 
 
 
@@ -235,28 +352,41 @@ class CDSParser(object):
         """
         pass
 
-    def parse_at_id(self, arxiv_id,server='CDS'):
-        """Helper method to read data from URL, and passes on to parse()."""
+    def parse_at_id(self, arxiv_id,server='CDS', xml=None):
+        """Helper method to read data from URL, and passes on to parse().
+
+        :param xml: the MARCXML search result for `arxiv_id`, if already
+            fetched
+        """
         from xml.etree import ElementTree
         if server=='CDS':
             logging.debug('requested server for MARCXML is %s ' % server)
-            self.url = 'https://cds.cern.ch/search?ln=en&p=reportnumber%3A"' + arxiv_id + '"&action_search=Search&op1=a&m1=a&p1=&f1=&c=CERN+Document+Server&sf=&so=d&rm=&rg=10&sc=1&of=xm'
-            ads_url_base = 'https://cds.cern.ch/record/'
+            self.url = CDS_SEARCH_URL % (
+                urllib.quote('reportnumber:"%s"' % arxiv_id), 10)
+            ads_url_base = CDS_RECORD_URL
 
         if server =='Inspires':
             logging.debug('requested server for MARCXML is %s ' % server)
             self.url='https://inspirehep.net/search?ln=en&p=recid+'+arxiv_id+'&of=xm'
             ads_url_base =  'https://inspirehep.net/record/'
         try:
-            self.xml = ElementTree.fromstring(urllib2.urlopen(self.url).read())
+            self.xml = xml if xml is not None else \
+                ElementTree.fromstring(httpbibdesk.fetch(self.url))
         except (urllib2.HTTPError, urllib2.URLError), err:
             logging.debug("Could not get MARCXML from URL: %s", self.url)
             raise ArXivException(err)
 
-        if find_recid_in_xml(self.xml)>0:
+        records = split_collection(self.xml) or [MarcRecord(self.xml)]
+        # the record carrying the requested report number, if any
+        self.record = records[0]
+        for record in records:
+            if identbibdesk.canonical('report', arxiv_id) in \
+                    find_report_numbers_in_xml(record):
+                self.record = record
+                break
+        if find_recid_in_xml(self.record)>0:
             logging.debug('recid found')
-            self.bibtex(self.xml,server=server)
-            self.ads_url = ads_url_base + self.recid + "/"
+            self.parse_record(self.record, server, ads_url_base)
 
             #print getattr(self.bib, 'Title')
             #pdf_url = find_pdf_in_xml(self.xml)
@@ -270,10 +400,18 @@ class CDSParser(object):
         #self.info = self.parse(self.xml)
         #self.bib = self.bibtex(self.info)  # FIXME looks like self.bib is None
 
+    def parse_record(self, record, server='CDS', ads_url_base=CDS_RECORD_URL):
+        """Set `bib` and `ads_url` from a single `MarcRecord`"""
+        self.record = record
+        self.bibtex(record, server=server)
+        self.ads_url = ads_url_base + self.recid + "/"
+
     def bibtex(self,xml,server='CDS'):
 
         print 'Called the cds.bibtex method with options server=',server
         print xml 
+        # index the record once for all the lookups below
+        xml = marc_record(xml)
         bibentry = CDSbibtex()
         bibentry.Eprint = find_eprint_in_xml(xml)
         logging.debug('Filled with EPRINT %s ' % bibentry.Eprint)
@@ -374,6 +512,102 @@ class CDSParser(object):
         #    '}'
 
 
+class InspireException(Exception):
+    pass
+
+
+class InspireNotFound(InspireException):
+    """Inspire answered, but has no such record"""
+    pass
+
+
+class InspireParser(object):
+    """Builds the same bibtex record as `CDSParser` with server='Inspires',
+    from the Inspire JSON API instead of the legacy MARCXML search. Only
+    the `INSPIRE_FIELDS` are requested, leaving out the affiliations and
+    identifiers of every author, references, etc.
+    """
+
+    def parse_at_id(self, recid):
+        """Fetch and parse the Inspire record `recid`"""
+        self.url = '%s/%s?%s' % (INSPIRE_API_URL, recid, urllib.urlencode(
+            {'fields': ','.join(INSPIRE_FIELDS)}))
+        self.parse_record(self._fetch()['metadata'])
+
+    def parse_at_doi(self, doi):
+        """Search Inspire for `doi` and parse the first record found"""
+        self.url = '%s?%s' % (INSPIRE_API_URL, urllib.urlencode(
+            {'q': 'doi:"%s"' % doi, 'size': 1,
+             'fields': ','.join(INSPIRE_FIELDS)}))
+        hits = self._fetch()['hits']['hits']
+        if not hits:
+            raise InspireNotFound('no Inspire record for DOI %s' % doi)
+        self.parse_record(hits[0]['metadata'])
+
+    def _fetch(self):
+        logging.debug('trying to get ' + self.url)
+        try:
+            return json.loads(httpbibdesk.fetch(
+                self.url, headers={'Accept': 'application/json'}))
+        except urllib2.HTTPError, err:
+            logging.debug("Could not get Inspire JSON from URL: %s", self.url)
+            # other errors, e.g. 429 when throttled, say nothing about
+            # whether the record exists
+            if err.code == 404:
+                raise InspireNotFound(err)
+            raise InspireException(err)
+        except (urllib2.URLError, ValueError), err:
+            logging.debug("Could not get Inspire JSON from URL: %s", self.url)
+            raise InspireException(err)
+
+    def parse_record(self, metadata):
+        """Set `bib`, `recid` and `ads_url` from the `metadata` of an
+        Inspire JSON record"""
+        def first(key, field, default=''):
+            for item in metadata.get(key, []):
+                if item.get(field):
+                    return item[field]
+            return default
+
+        self.recid = str(metadata['control_number'])
+        publication = (metadata.get('publication_info') or [{}])[0]
+        eprint = first('arxiv_eprints', 'value')
+
+        bibentry = CDSbibtex()
+        bibentry.Eprint = eprint and 'arXiv:' + eprint or self.recid
+        bibentry.recid = self.recid
+        bibentry.Author = ' and '.join(
+            [TeXify(author['full_name'])
+             for author in metadata.get('authors', [])])
+        bibentry.Journal = publication.get('journal_title') or \
+            (eprint and 'arXiv:' + eprint)
+        bibentry.Year = publication.get('year', '')
+        bibentry.Volume = publication.get('journal_volume', '')
+        if publication.get('page_start'):
+            bibentry.Pages = '-'.join(
+                [publication['page_start']] +
+                [publication['page_end']] * bool(publication.get('page_end')))
+        else:
+            bibentry.Pages = publication.get('artid', '')
+        bibentry.number = publication.get('journal_issue', '')
+        bibentry.doi = first('dois', 'value')
+        self.ads_url = bibentry.Url = INSPIRE_RECORD_URL + self.recid + "/"
+        bibentry.Title = first('titles', 'title')
+        bibentry.Abstract = first('abstracts', 'value')
+        bibentry.AdsComment = ''
+
+        pdf = ''
+        for document in metadata.get('documents', []):
+            if document.get('fulltext') or \
+                    document.get('url', '').endswith('.pdf'):
+                pdf = document['url']
+                break
+        if not pdf and eprint:
+            pdf = 'https://arxiv.org/pdf/' + eprint
+        bibentry.info = {'link': pdf}
+        self.bib = bibentry
+
+
 #cds_id='CMS-PAS-SMP-17-004'
 #cds_id='CMS-PAS-HIG-16-027'
 #print('working on '+cds_id)
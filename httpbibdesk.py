@@ -0,0 +1,785 @@
+"""
+ADS to BibDesk -- frictionless import of ADS publications into BibDesk
+Copyright (C) 2014  Rui Pereira <rui.pereira@gmail.com> and
+                    Jonathan Sick <jonathansick@mac.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Shared HTTP client layer for arxivbibdesk and cdsbibdesk.
+
+Every fetch goes through `urlopen()`, a drop-in replacement for
+`urllib2.urlopen()` that keeps HTTP(S) connections alive per host, so
+that the several requests a single token makes to inspirehep.net or
+cds.cern.ch only pay for one TCP/TLS handshake.
+
+API responses (arXiv, Inspire, CDS) are read with `fetch()`, or
+`fetch_stream()` to parse them as they arrive, which in addition go through
+an optional on-disk `ResponseCache`, revalidated with conditional GETs.
+
+Every request that actually reaches the network first waits on the
+`RateLimiter`, a token bucket per host, so that a host is only throttled
+when it is about to be hit too fast.
+"""
+import errno
+import hashlib
+import httplib
+import json
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+
+USER_AGENT = 'Python-urllib/%s' % sys.version[:3]
+
+# responses with these codes carry a Location header to follow
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+# errors raised when the server dropped an idle keep-alive connection
+STALE_ERRORS = (httplib.BadStatusLine, httplib.CannotSendRequest,
+                httplib.ResponseNotReady)
+STALE_ERRNOS = (errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED)
+
+# unread bodies up to this size are drained to keep the connection alive
+DRAIN_SIZE = 2 ** 16
+
+# downloads are streamed to disk in chunks of this size, and resumed this
+# many times when interrupted, waiting DOWNLOAD_BACKOFF seconds before the
+# first retry and twice as long before each next one
+CHUNK_SIZE = 2 ** 16
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_BACKOFF = 1.
+
+# (requests per second, burst) for hosts with their own published limits;
+# the arXiv API asks for no more than one request every three seconds
+HOST_RATES = {'export.arxiv.org': (1 / 3., 1)}
+
+
+class PooledResponse(object):
+    """File-like HTTP response, compatible with what `urllib2.urlopen()`
+    returns (`read`, `readline`, iteration, `geturl`, `info`, `headers`).
+
+    The underlying connection goes back to its pool as soon as the body has
+    been read completely, or is dropped if the response is closed early.
+    """
+
+    def __init__(self, pool, key, conn, response, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._buffer = ''
+        self.url = url
+        self.code = response.status
+        self.msg = response.reason
+        self.headers = response.msg
+
+    def info(self):
+        return self.headers
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return self.code
+
+    def read(self, amt=None):
+        if amt is None:
+            data = self._buffer + self._read()
+            self._buffer = ''
+        elif len(self._buffer) >= amt:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        else:
+            data = self._buffer + self._read(amt - len(self._buffer))
+            self._buffer = ''
+        return data
+
+    def readline(self):
+        while '\n' not in self._buffer:
+            chunk = self._read(8192)
+            if not chunk:
+                break
+            self._buffer += chunk
+        end = self._buffer.find('\n') + 1 or len(self._buffer)
+        line, self._buffer = self._buffer[:end], self._buffer[end:]
+        return line
+
+    def readlines(self):
+        return list(self)
+
+    def __iter__(self):
+        line = self.readline()
+        while line:
+            yield line
+            line = self.readline()
+
+    def close(self):
+        """Release the connection: keep it alive if the body is exhausted,
+        otherwise close it since the socket still holds unread data."""
+        if self._conn is None:
+            return
+        if not self._response.isclosed() and \
+                self._response.length is not None and \
+                self._response.length <= DRAIN_SIZE:
+            # cheaper to drain a short body (e.g. redirects) than reconnect
+            try:
+                self._response.read()
+            except (socket.error, httplib.HTTPException):
+                pass
+        # unread data, or body cut short by the server
+        if not self._response.isclosed() or self._response.length:
+            self._conn.close()
+        self._pool._checkin(self._key, self._conn)
+        self._conn = None
+
+    def __del__(self):
+        self.close()
+
+    def _read(self, amt=None):
+        if self._conn is None:
+            return ''
+        if amt is None:
+            data = self._response.read()
+        else:
+            data = self._response.read(amt)
+        if self._response.isclosed():
+            self.close()
+        return data
+
+
+class ConnectionPool(object):
+    """Keep-alive HTTP(S) connections, indexed by (scheme, host:port).
+
+    Connections are checked out for the duration of a single request and
+    checked back in once its response has been consumed, so the pool can be
+    shared safely across threads. At most `max_per_host` connections to the
+    same host are checked out at once (None for no limit); further requests
+    wait for one to be released, or for `wait_timeout` seconds at most.
+    """
+
+    def __init__(self, max_redirects=10, max_per_host=None, wait_timeout=60):
+        self.max_redirects = max_redirects
+        self.max_per_host = max_per_host
+        self.wait_timeout = wait_timeout
+        self._idle = {}
+        self._active = {}
+        # reentrant: a response garbage collected while the lock is held
+        # checks its connection back in
+        self._lock = threading.RLock()
+        self._released = threading.Condition(self._lock)
+
+    def urlopen(self, url, data=None, headers=None):
+        """Open `url` (a string or a `urllib2.Request`) reusing pooled
+        connections, following redirects.
+
+        :return: a `PooledResponse`
+        :raises urllib2.HTTPError: for HTTP status >= 400
+        :raises urllib2.URLError: when the host cannot be reached
+        """
+        all_headers = {'User-Agent': USER_AGENT}
+        if isinstance(url, urllib2.Request):
+            all_headers.update(url.header_items())
+            data = url.get_data() if data is None else data
+            url = url.get_full_url()
+        all_headers.update(headers or {})
+
+        # honour proxy settings the way urllib2 would
+        parts = urlparse.urlsplit(url)
+        if parts.scheme in urllib.getproxies():
+            limiter.wait(parts.hostname)
+            return urllib2.urlopen(urllib2.Request(url, data, all_headers))
+
+        for _ in range(self.max_redirects + 1):
+            response = self._request(url, data, all_headers)
+            if response.code not in REDIRECT_CODES or \
+                    not response.headers.get('location'):
+                break
+            response.close()
+            url = urlparse.urljoin(url, response.headers['location'])
+            logging.debug('redirected to %s', url)
+            if response.code == 303 or \
+                    (response.code in (301, 302) and data is not None):
+                data = None
+        else:
+            raise urllib2.HTTPError(url, response.code,
+                                    'too many redirects',
+                                    response.headers, response)
+
+        if response.code >= 400:
+            raise urllib2.HTTPError(url, response.code, response.msg,
+                                    response.headers, response)
+        return response
+
+    def clear(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _request(self, url, data, headers):
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise urllib2.URLError('unknown url type: %s' % parts.scheme)
+        key = (parts.scheme, parts.netloc)
+        path = urlparse.urlunsplit(('', '', parts.path or '/',
+                                    parts.query, ''))
+        method = 'GET' if data is None else 'POST'
+
+        limiter.wait(parts.hostname)
+        conn, reused = self._checkout(key)
+        try:
+            try:
+                conn.request(method, path, data, headers)
+                response = conn.getresponse()
+            except (socket.error,) + STALE_ERRORS, err:
+                conn.close()
+                stale = isinstance(err, STALE_ERRORS) or \
+                    getattr(err, 'errno', None) in STALE_ERRNOS
+                if not (reused and stale):
+                    raise
+                # the server closed the idle connection: retry on a new one
+                logging.debug('stale connection to %s, reconnecting',
+                              parts.netloc)
+                conn.request(method, path, data, headers)
+                response = conn.getresponse()
+        except (socket.error, httplib.HTTPException), err:
+            conn.close()
+            self._checkin(key, conn)
+            raise urllib2.URLError(err)
+        return PooledResponse(self, key, conn, response, url)
+
+    def _checkout(self, key):
+        with self._lock:
+            if self.max_per_host:
+                deadline = time.time() + self.wait_timeout
+                while self._active.get(key, 0) >= self.max_per_host:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        # never deadlock on a response nobody closed
+                        logging.debug('connection limit exceeded for %s',
+                                      key[1])
+                        break
+                    self._released.wait(remaining)
+            self._active[key] = self._active.get(key, 0) + 1
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, netloc = key
+        if scheme == 'https':
+            return httplib.HTTPSConnection(netloc), False
+        return httplib.HTTPConnection(netloc), False
+
+    def _checkin(self, key, conn):
+        """Give back a checked out connection (closed ones reconnect on
+        their next request)."""
+        with self._lock:
+            self._active[key] -= 1
+            if conn.sock is not None:
+                self._idle.setdefault(key, []).append(conn)
+            self._released.notify()
+
+
+class ResponseCache(object):
+    """Persistent cache of HTTP response bodies.
+
+    Each response is stored as a ``<key>.body`` file plus a ``<key>.json``
+    file with its validators (ETag, Last-Modified) and the time it was last
+    validated. Entries younger than `ttl` seconds are served without any
+    network access; older ones are revalidated with a conditional GET, which
+    usually costs a bare 304. The modification time of the body file tracks
+    the last access, and the least recently used entries are evicted once the
+    bodies exceed `max_size` bytes.
+    """
+
+    def __init__(self, path, ttl=86400, max_size=50 * 2 ** 20):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def fetch(self, opener, url, headers=None):
+        """Return the body of `url`, using `opener` (an `urlopen`-like
+        callable) only when the cached copy is missing or stale."""
+        stream = self.open(opener, url, headers)
+        try:
+            return stream.read()
+        finally:
+            stream.close()
+
+    def open(self, opener, url, headers=None):
+        """Same as `fetch()`, returning a file-like object instead. A body
+        coming from the network is cached as it is read, once read to the
+        end."""
+        headers = dict(headers or {})
+        key = self._key(url, headers)
+        meta = self._load(key)
+        if meta is not None and time.time() - meta['validated'] < self.ttl:
+            logging.debug('cache hit for %s', url)
+            return self._open_body(key)
+
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            response = opener(url, headers=headers)
+        except urllib2.HTTPError, err:
+            # urllib2 (used behind proxies) raises on 304
+            if meta is None or err.code != 304:
+                raise
+            response = err
+        if response.code == 304 and meta is not None:
+            logging.debug('cache revalidated %s', url)
+            response.read()
+            meta['validated'] = time.time()
+            self._store(key, meta)
+            return self._open_body(key)
+
+        return CachingResponse(self, key, {
+            'url': url,
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'validated': time.time()}, response)
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            for name in os.listdir(self.path):
+                os.remove(os.path.join(self.path, name))
+
+    def _key(self, url, headers):
+        # content negotiation makes the same URL return different documents
+        accept = dict((k.lower(), v) for k, v in headers.items()).get(
+            'accept', '')
+        return hashlib.sha1(url + '\n' + accept).hexdigest()
+
+    def _load(self, key):
+        try:
+            with open(os.path.join(self.path, key + '.json')) as f:
+                meta = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if not os.path.exists(os.path.join(self.path, key + '.body')):
+            return None
+        return meta
+
+    def _open_body(self, key):
+        path = os.path.join(self.path, key + '.body')
+        # bump access time for LRU eviction
+        os.utime(path, None)
+        return open(path, 'rb')
+
+    def _store(self, key, meta, body_path=None):
+        if body_path is not None:
+            os.rename(body_path, os.path.join(self.path, key + '.body'))
+        self._write(key + '.json', json.dumps(meta))
+        if body_path is not None:
+            self._evict()
+
+    def _write(self, name, data):
+        # atomic replace, safe against concurrent readers
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp, os.path.join(self.path, name))
+
+    def _evict(self):
+        with self._lock:
+            bodies = []
+            for name in os.listdir(self.path):
+                if name.endswith('.body'):
+                    st = os.stat(os.path.join(self.path, name))
+                    bodies.append((st.st_mtime, st.st_size, name[:-5]))
+            total = sum(size for _, size, _ in bodies)
+            for _, size, key in sorted(bodies):
+                if total <= self.max_size:
+                    break
+                for ext in ('.body', '.json'):
+                    try:
+                        os.remove(os.path.join(self.path, key + ext))
+                    except OSError:
+                        pass
+                total -= size
+
+
+class CachingResponse(object):
+    """Response whose body is copied into a `ResponseCache` as it is read.
+
+    The copy goes to a temporary file, stored as the cache entry only when
+    the body has been read to the end; a response closed early is not
+    cached.
+    """
+
+    def __init__(self, cache, key, meta, response):
+        self._cache = cache
+        self._key = key
+        self._meta = meta
+        self._response = response
+        fd, self._tmp = tempfile.mkstemp(dir=cache.path, suffix='.tmp')
+        self._copy = os.fdopen(fd, 'wb')
+
+    def read(self, amt=None):
+        data = self._response.read() if amt is None \
+            else self._response.read(amt)
+        if self._copy is not None:
+            self._copy.write(data)
+            if amt is None or not data:
+                self._copy.close()
+                self._copy = None
+                self._cache._store(self._key, self._meta, self._tmp)
+        return data
+
+    def geturl(self):
+        return self._response.geturl()
+
+    def info(self):
+        return self._response.info()
+
+    def close(self):
+        if self._copy is not None:
+            self._copy.close()
+            self._copy = None
+            _remove(self._tmp)
+        self._response.close()
+
+    def __del__(self):
+        self.close()
+
+
+class TokenBucket(object):
+    """Token bucket allowing `burst` back-to-back requests, refilled at
+    `rate` requests per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.)
+        self._tokens = self.burst
+        self._stamp = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available.
+
+        :return: the number of seconds waited
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            # reserve the token now, so that concurrent callers queue up
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RateLimiter(object):
+    """Per-host token buckets.
+
+    Hosts listed in `hosts` (a dict of host -> (rate, burst)) use their own
+    limits, every other host gets `rate` and `burst`. A rate <= 0 means
+    unlimited.
+    """
+
+    def __init__(self, rate=1, burst=5, hosts=None):
+        self.rate = rate
+        self.burst = burst
+        self.hosts = dict(hosts or {})
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        """Block until a request to `host` is allowed.
+
+        :return: the number of seconds waited
+        """
+        host = (host or '').lower()
+        with self._lock:
+            if host not in self._buckets:
+                rate, burst = self.hosts.get(host, (self.rate, self.burst))
+                self._buckets[host] = rate > 0 and \
+                    TokenBucket(rate, burst) or None
+            bucket = self._buckets[host]
+        if bucket is None:
+            return 0
+        wait = bucket.acquire()
+        if wait:
+            logging.debug('waited %.1fs for %s', wait, host)
+        return wait
+
+
+def parse_host_rates(spec):
+    """Parse a ``host:rate:burst,host:rate:burst`` preference string into a
+    dict of host -> (rate, burst). Malformed entries are logged and
+    skipped."""
+    hosts = {}
+    for item in str(spec or '').split(','):
+        if not item.strip():
+            continue
+        try:
+            host, rate, burst = item.strip().rsplit(':', 2)
+            hosts[host.lower()] = (float(rate), float(burst))
+        except ValueError:
+            logging.info('ignoring malformed host rate limit %r', item.strip())
+    return hosts
+
+
+# connection pool shared by every fetcher
+pool = ConnectionPool()
+
+# per-host rate limits, see install_rate_limiter()
+limiter = RateLimiter(hosts=HOST_RATES)
+
+# on-disk response cache, see install_cache()
+cache = None
+
+
+def urlopen(url, data=None, headers=None):
+    """Open `url` through the shared keep-alive connection pool"""
+    return pool.urlopen(url, data, headers)
+
+
+def download(url, path, max_size=None, magic='%PDF',
+             sniff_size=DRAIN_SIZE, retries=DOWNLOAD_RETRIES,
+             backoff=DOWNLOAD_BACKOFF):
+    """Stream `url` to the file at `path` in chunks of `CHUNK_SIZE` bytes,
+    logging progress when the server sends a Content-Length.
+
+    Downloads larger than `max_size` bytes are aborted, leaving an empty
+    file. When `magic` does not show up in the first bytes (e.g. an HTML
+    error page instead of a PDF) only `sniff_size` bytes are kept.
+
+    The file is first downloaded to a partial file named after `url` (see
+    `partial_path()`), and moved to `path` once done. If the transfer is
+    interrupted and the server accepts byte ranges, the bytes received so
+    far are recorded in a journal next to the partial file and the
+    download is resumed with a Range request, up to `retries` times with
+    exponential `backoff`. When it keeps failing, the partial file and its
+    journal are kept, so that a later call for the same URL resumes it.
+    Concurrent downloads of the same URL wait for each other.
+
+    :return: True if the complete file was saved and starts with `magic`
+    :raises urllib2.URLError: if the download keeps failing
+    """
+    partial = partial_path(url)
+    with _partial_lock(partial):
+        return _download(url, path, partial, max_size, magic, sniff_size,
+                         retries, backoff)
+
+
+def _download(url, path, partial, max_size, magic, sniff_size, retries,
+              backoff):
+    """download() into the `partial` file, once its lock is held"""
+    journal = partial + '.journal'
+    attempt = 0
+    while True:
+        resume = _read_journal(journal, url, partial)
+        try:
+            valid = _stream(url, partial, journal, resume,
+                            max_size, magic, sniff_size)
+        except urllib2.HTTPError, err:
+            # the range starts at the end of the file: it was complete
+            if err.code == 416 and resume is not None and \
+                    err.hdrs.get('content-range') == \
+                    'bytes */%i' % resume['size']:
+                logging.debug('%s was already complete', url)
+                _remove(journal)
+                shutil.move(partial, path)
+                return True
+            _remove(journal)
+            _remove(partial)
+            raise
+        except (socket.error, httplib.HTTPException, urllib2.URLError), err:
+            attempt += 1
+            if attempt > retries:
+                if not isinstance(err, urllib2.URLError):
+                    err = urllib2.URLError(err)
+                raise err
+            delay = backoff * 2 ** (attempt - 1)
+            logging.debug('download of %s interrupted (%s), retrying in %gs',
+                          url, err, delay)
+            time.sleep(delay)
+            continue
+        _remove(journal)
+        shutil.move(partial, path)
+        return valid
+
+
+# locks of the partial files being downloaded, by path
+_partial_locks = {}
+_partial_locks_lock = threading.Lock()
+
+
+def _partial_lock(partial):
+    with _partial_locks_lock:
+        return _partial_locks.setdefault(partial, threading.Lock())
+
+
+def partial_path(url):
+    """:return: where download() keeps the partial download of `url`: in
+    the response cache directory when installed, else the temporary
+    directory"""
+    directory = cache.path if cache is not None else tempfile.gettempdir()
+    return os.path.join(directory,
+                        hashlib.sha1(url).hexdigest() + '.partial')
+
+
+def _stream(url, path, journal, resume, max_size, magic, sniff_size):
+    """Single download attempt for download(), resuming from the `resume`
+    journal state when given."""
+    headers = {}
+    if resume is not None:
+        headers['Range'] = 'bytes=%i-' % resume['size']
+        # only resume if the file did not change on the server
+        validator = resume.get('etag') or resume.get('last_modified')
+        if validator:
+            headers['If-Range'] = validator
+    response = urlopen(url, headers=headers)
+
+    length = response.headers.get('content-length', '')
+    total = int(length) if length.isdigit() else None
+    content_range = response.headers.get('content-range', '')
+    if response.code == 206 and resume is not None and \
+            content_range.startswith('bytes %i-' % resume['size']):
+        logging.debug('resuming %s at %i bytes', url, resume['size'])
+        done = resume['size']
+        total = total and total + done
+        valid = True
+        mode = 'ab'
+    else:
+        done = 0
+        valid = None
+        mode = 'wb'
+    if max_size and total and total > max_size:
+        response.close()
+        open(path, 'wb').close()
+        logging.debug('%s is too large (%i bytes)', url, total)
+        return False
+    resumable = response.code == 206 or \
+        response.headers.get('accept-ranges', '').lower() == 'bytes'
+
+    step = total and done * 10 // total
+    with open(path, mode) as f:
+        try:
+            chunk = response.read(CHUNK_SIZE)
+            while chunk:
+                if valid is None:
+                    valid = magic in chunk[:1024]
+                f.write(chunk)
+                done += len(chunk)
+                if not valid and done >= sniff_size:
+                    logging.debug('%s does not look like %s, aborted',
+                                  url, magic)
+                    response.close()
+                    return False
+                if max_size and done > max_size:
+                    logging.debug('%s is too large, aborted', url)
+                    response.close()
+                    f.truncate(0)
+                    return False
+                if total and done * 10 // total > step:
+                    step = done * 10 // total
+                    logging.debug('downloaded %i of %i kB (%i%%)',
+                                  done // 1024, total // 1024, step * 10)
+                chunk = response.read(CHUNK_SIZE)
+            if total and done < total:
+                raise httplib.IncompleteRead('', total - done)
+        except (socket.error, httplib.HTTPException):
+            if resumable and valid:
+                f.flush()
+                _write_journal(journal, {
+                    'url': url, 'size': f.tell(),
+                    'etag': response.headers.get('etag'),
+                    'last_modified': response.headers.get('last-modified')})
+            raise
+    return bool(valid)
+
+
+def _read_journal(journal, url, path):
+    """:return: the journal state of a partial download of `url` into
+    `path`, or None if there is nothing to resume"""
+    try:
+        with open(journal) as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if state.get('url') != url or not os.path.exists(path) or \
+            os.path.getsize(path) != state.get('size'):
+        return None
+    return state
+
+
+def _write_journal(journal, state):
+    with open(journal, 'w') as f:
+        json.dump(state, f)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def install_cache(path, ttl, max_size):
+    """Enable the on-disk response cache used by `fetch()`.
+
+    A `max_size` of 0 disables caching.
+    """
+    global cache
+    cache = ResponseCache(path, ttl, max_size) if max_size > 0 else None
+
+
+def install_rate_limiter(rate, burst, hosts=None):
+    """Set the default per-host `rate` (requests per second) and `burst`,
+    plus host specific overrides on top of `HOST_RATES`."""
+    global limiter
+    all_hosts = dict(HOST_RATES)
+    all_hosts.update(hosts or {})
+    limiter = RateLimiter(rate, burst, all_hosts)
+
+
+def fetch(url, headers=None):
+    """Return the body of `url` (a string or a `urllib2.Request`), served
+    from the response cache when one is installed."""
+    if isinstance(url, urllib2.Request):
+        headers = dict(url.header_items(), **(headers or {}))
+        url = url.get_full_url()
+    if cache is None:
+        return urlopen(url, headers=headers).read()
+    return cache.fetch(urlopen, url, headers)
+
+
+def fetch_stream(url, headers=None):
+    """Same as `fetch()`, returning a file-like object to read the body
+    from as it arrives."""
+    if isinstance(url, urllib2.Request):
+        headers = dict(url.header_items(), **(headers or {}))
+        url = url.get_full_url()
+    if cache is None:
+        return urlopen(url, headers=headers)
+    return cache.open(urlopen, url, headers)
@@ -0,0 +1,216 @@
+"""
+ADS to BibDesk -- frictionless import of ADS publications into BibDesk
+Copyright (C) 2014  Rui Pereira <rui.pereira@gmail.com> and
+                    Jonathan Sick <jonathansick@mac.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Article identifiers: recognition and canonical keys.
+
+`parse()` turns a token (a bare identifier, or one with a scheme or URL
+prefix) into an `Identifier` of kind 'arxiv', 'doi', 'bibcode', 'report'
+or 'recid'. Its `key` is the same for every spelling of the same article,
+e.g. ``arXiv:1207.7214v2``, ``https://arxiv.org/abs/1207.7214`` and
+``1207.7214`` all give ``arxiv:1207.7214``, and is what caches and
+duplicate checks should be keyed on.
+
+The `find_*()` helpers look for identifiers within free text, and
+`record_keys()` gives the keys of a BibTeX record of the library.
+"""
+import re
+
+# token syntax, in order of precedence, see classify()
+PATTERNS = [
+    # new style arXiv identifier (YYMM.NNNN[N], optional version)
+    ('arxiv', re.compile(
+        r'^(?:arxiv:|(?:https?://)?(?:[\w.]*\.)?arxiv\.org/(?:abs|pdf)/)?'
+        r'(\d{4}\.\d{4,5}(?:v\d+)?)(?:\.pdf)?$', re.I)),
+    # old style arXiv identifier (archive[.SC]/YYMMNNN)
+    ('arxiv', re.compile(
+        r'^(?:arxiv:|(?:https?://)?(?:[\w.]*\.)?arxiv\.org/(?:abs|pdf)/)?'
+        r'([a-z][a-z\-]*(?:\.[a-z]{2})?/\d{7}(?:v\d+)?)(?:\.pdf)?$', re.I)),
+    ('doi', re.compile(
+        r'^(?:doi:\s*|(?:https?://)?(?:dx\.)?doi\.org/)?'
+        r'(10\.\d{4,9}/\S+)$', re.I)),
+    # YYYYJJJJJVVVVMPPPPA
+    ('bibcode', re.compile(r'^(\d{4}[a-z&][\w&.]{13}[a-z.])$', re.I)),
+    # CERN report number, e.g. CMS-PAS-HIG-16-027 or ATLAS-CONF-2019-001
+    ('report', re.compile(r'^([a-z][a-z0-9]*(?:-[a-z0-9]+){2,})$', re.I)),
+    # Inspire record number
+    ('recid', re.compile(r'^(\d{1,8})$')),
+]
+
+# arXiv identifiers within text, bare or after an arXiv: prefix
+ARXIV_SEARCH = re.compile(
+    r'(?<![\w./])(\d{4}\.\d{4,5}(?:v\d+)?|'
+    r'[a-z][a-z\-]*(?:\.[a-z]{2})?/\d{7}(?:v\d+)?)(?![\d/])', re.I)
+# arXiv identifiers within text, only after an arXiv: prefix
+ARXIV_PREFIXED_SEARCH = re.compile(
+    r'arXiv:\s*(\d{4}\.\d{4,5}(?:v\d+)?|'
+    r'[a-z][a-z\-]*(?:\.[a-z]{2})?/\d{7}(?:v\d+)?)', re.I)
+# DOIs within text, without trailing punctuation
+DOI_SEARCH = re.compile(
+    r'(10[.][0-9]{4,}(?:[.][0-9]+)*/(?:(?!["&\'<>])\S)*'
+    r'(?:(?!["&\'<>\).,;])\S))')
+
+# Inspire record page, as in the Url field of records from Inspire
+INSPIRE_RECORD_SEARCH = re.compile(
+    r'inspirehep\.net/(?:record|literature)/(\d+)', re.I)
+# what the Eprint field of a record may hold, unlike Inspire or CDS recids
+EPRINT_KINDS = ('arxiv', 'report', 'doi')
+
+_VERSION = re.compile(r'v\d+$')
+# subject class of old style arXiv identifiers, e.g. the .GT of math.GT/
+_SUBJECT_CLASS = re.compile(r'\.[a-z]{2}(?=/)')
+
+
+class Identifier(object):
+    """An article identifier: its `kind`, canonical `id` and, for arXiv,
+    `version` ('v2', or '' if unversioned)"""
+
+    __slots__ = ('kind', 'id', 'version')
+
+    def __init__(self, kind, ident):
+        self.kind = kind
+        self.version = ''
+        if kind == 'arxiv':
+            match = _VERSION.search(ident)
+            self.version = match.group() if match else ''
+        self.id = canonical(kind, ident)
+
+    @property
+    def key(self):
+        """'kind:id', the same for all spellings of the identifier"""
+        return '%s:%s' % (self.kind, self.id)
+
+    @property
+    def versioned(self):
+        """:return: `id` with its version, if any"""
+        return self.id + self.version
+
+    def __eq__(self, other):
+        return isinstance(other, Identifier) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return self.key
+
+    def __repr__(self):
+        return '<Identifier %s%s>' % (self.key, self.version)
+
+
+def classify(token):
+    """
+    Classify an article token from its syntax alone
+
+    :return: a ``(kind, identifier)`` tuple, where identifier is the bare ID
+        as written, stripped of URL or scheme prefixes; ``(None, token)``
+        when the token is not recognised
+    """
+    token = token.strip()
+    for kind, pattern in PATTERNS:
+        match = pattern.match(token)
+        if match:
+            return kind, match.group(1)
+    return None, token
+
+
+def parse(token):
+    """:return: the `Identifier` of `token`, or None if not recognised"""
+    kind, ident = classify(token)
+    if kind is None:
+        return None
+    return Identifier(kind, ident)
+
+
+def key(token):
+    """:return: the canonical key of `token`, or the lower case token if
+    it is not recognised"""
+    ident = parse(token)
+    if ident is None:
+        return token.strip().lower()
+    return ident.key
+
+
+def canonical(kind, ident):
+    """:return: canonical spelling of the bare identifier `ident`:
+
+    - arXiv: without version, old style in lower case and without subject
+      class (math/0309136)
+    - DOI: lower case, as DOIs are case insensitive
+    - report number: upper case
+    - recid: without leading zeros
+    - bibcode: unchanged
+    """
+    if kind == 'arxiv':
+        return _SUBJECT_CLASS.sub('', strip_version(ident).lower())
+    elif kind == 'doi':
+        return ident.lower()
+    elif kind == 'report':
+        return ident.upper()
+    elif kind == 'recid':
+        return str(int(ident))
+    return ident
+
+
+def strip_version(arxiv_id):
+    """:return: `arxiv_id` without its version"""
+    return _VERSION.sub('', arxiv_id)
+
+
+def find_arxiv_ids(text, prefixed=False):
+    """:return: list of the arXiv identifiers in `text`, only those after
+    an arXiv: prefix if `prefixed`"""
+    pattern = ARXIV_PREFIXED_SEARCH if prefixed else ARXIV_SEARCH
+    return pattern.findall(text)
+
+
+def find_dois(text):
+    """:return: list of the distinct DOIs in `text`"""
+    return list(set(DOI_SEARCH.findall(text)))
+
+
+def ads_query(adsurl):
+    """:return: the bibcode or arXiv:ID queried by an ADS abstract URL,
+    either .../abs/<bibcode> or .../bib_query?<bibcode>"""
+    return adsurl.split('bib_query?')[-1].split('abs/')[-1]
+
+
+def record_keys(doi=None, eprint=None, adsurl=None, url=None):
+    """
+    Canonical keys of a publication, from the BibTeX fields that identify
+    it
+
+    :param eprint: arXiv ID or CERN report number (CDS and Inspire records
+        fall back to their recid, which is ignored)
+    :param adsurl: ADS abstract page, arXiv abstract page or Inspire record
+    :param url: Inspire or CDS record page
+    :return: set of keys
+    """
+    keys = set()
+    for text, kinds in ((doi, ('doi',)), (eprint, EPRINT_KINDS),
+                        (adsurl and ads_query(adsurl), None)):
+        ident = parse(text) if text else None
+        if ident is not None and (kinds is None or ident.kind in kinds):
+            keys.add(ident.key)
+    for text in (adsurl, url):
+        match = text and INSPIRE_RECORD_SEARCH.search(text)
+        if match:
+            keys.add('recid:%i' % int(match.group(1)))
+    return keys
@@ -101,7 +101,8 @@ setup(
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
         "Operating System :: MacOS :: MacOS X",
         "Topic :: Scientific/Engineering :: Astronomy"],
-    py_modules=['arxivbibdesk','cdsbibdesk'],
+    py_modules=['arxivbibdesk', 'bibtexbibdesk', 'cdsbibdesk', 'httpbibdesk',
+                'identbibdesk', 'mathmlbibdesk'],
     entry_points={'console_scripts': ['arxivbibdesk = arxivbibdesk:main']},
     cmdclass={'service': BuildService}
 )
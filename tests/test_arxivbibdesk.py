@@ -0,0 +1,144 @@
+"""
+Tests of the pure-Python parts of arxivbibdesk.
+
+arxivbibdesk needs PyObjC (AppKit), so these tests are skipped without it.
+Run from the repository root with::
+
+    python -m unittest discover -s tests
+"""
+import difflib
+import random
+import unittest
+import urllib2
+from StringIO import StringIO
+
+try:
+    import AppKit
+except ImportError:
+    AppKit = None
+
+if AppKit is not None:
+    import arxivbibdesk
+
+needs_appkit = unittest.skipIf(AppKit is None, 'PyObjC is not installed')
+
+TITLES = [
+    'Observation of a new particle in the search for the Standard Model '
+    'Higgs boson with the ATLAS detector at the LHC',
+    'Observation of a new boson at a mass of 125 GeV with the CMS '
+    'experiment at the LHC',
+    'Search for the Standard Model Higgs boson in the diphoton decay channel',
+    'Higgs boson',
+    'Dark matter',
+    'Dark energy',
+    'A',
+    '',
+]
+
+
+@needs_appkit
+class TitleIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(1)
+        words = ' '.join(TITLES).split()
+        self.titles = TITLES + [
+            ' '.join(rand.choice(words) for _ in range(rand.randint(1, 12)))
+            for _ in range(300)]
+        self.index = arxivbibdesk.TitleIndex(enumerate(self.titles))
+
+    def assertSameMatches(self, word, n=3, cutoff=0.6):
+        self.assertEqual(self.index.get_close_matches(word, n, cutoff),
+                         difflib.get_close_matches(word, self.titles, n,
+                                                   cutoff),
+                         '%r, n=%i, cutoff=%g' % (word, n, cutoff))
+
+    def test_same_matches_as_difflib(self):
+        rand = random.Random(2)
+        queries = TITLES + [
+            'observation of a new particle in the search for the standard '
+            'model higgs boson with the atlas detector',
+            'Dark  mater', 'Higgs', 'x'] + rand.sample(self.titles, 30)
+        for word in queries:
+            for cutoff in (0, .3, .6, .8, 1):
+                self.assertSameMatches(word, 3, cutoff)
+            self.assertSameMatches(word, 1)
+            self.assertSameMatches(word, 50, .5)
+
+    def test_updates(self):
+        self.index.discard(0)
+        self.index.discard(12345)
+        self.titles[0] = 'Dark matter annihilation'
+        self.index.add(0, self.titles[0])
+        self.assertSameMatches('Dark matter')
+        self.assertSameMatches(TITLES[0])
+        self.assertIn(0, self.index)
+        self.assertEqual(len(self.index), len(self.titles))
+
+    def test_bad_arguments(self):
+        self.assertRaises(ValueError, self.index.get_close_matches, 'x', 0)
+        self.assertRaises(ValueError, self.index.get_close_matches, 'x', 3,
+                          1.5)
+
+
+FEED_ENTRY = """
+  <entry>
+    <id>http://arxiv.org/abs/%s</id>
+    <updated>2012-08-31T19:59:34Z</updated>
+    <published>2012-07-31T17:59:24Z</published>
+    <title>Title of %s</title>
+    <summary>Abstract</summary>
+    <author><name>G. Aad</name></author>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom"
+        term="hep-ex" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>"""
+
+
+def feed(*ids):
+    """:return: arXiv API Atom feed with an entry for each of `ids`"""
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom">%s\n</feed>\n'
+            % ''.join(FEED_ENTRY % (ident, ident) for ident in ids))
+
+
+@needs_appkit
+class ResolveArXivBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fetch_stream = arxivbibdesk.httpbibdesk.fetch_stream
+        arxivbibdesk.httpbibdesk.fetch_stream = self.fake_fetch_stream
+        self.urls = []
+        self.feeds = []
+
+    def tearDown(self):
+        arxivbibdesk.httpbibdesk.fetch_stream = self.fetch_stream
+
+    def fake_fetch_stream(self, url, headers=None):
+        self.urls.append(url)
+        body = self.feeds.pop(0)
+        if isinstance(body, Exception):
+            raise body
+        return StringIO(body)
+
+    def test_requested_spellings_are_matched(self):
+        # the feed drops the subject class of old style identifiers
+        self.feeds.append(feed('1207.7214v2', 'math/0309136v1'))
+        resolved = arxivbibdesk.resolve_arxiv_batch(
+            ['math.GT/0309136', '1207.7214', '1207.7214v2', '1301.0001'])
+        self.assertEqual(len(self.urls), 1)
+        self.assertEqual(sorted(resolved),
+                         ['1207.7214', '1207.7214v2', 'math.GT/0309136'])
+        self.assertEqual(resolved['math.GT/0309136'].Eprint,
+                         'math/0309136v1')
+        self.assertIs(resolved['1207.7214'], resolved['1207.7214v2'])
+
+    def test_failed_chunk_is_left_out(self):
+        self.feeds.extend([urllib2.URLError('down'), feed('hep-ph/9905221')])
+        resolved = arxivbibdesk.resolve_arxiv_batch(
+            ['1207.7214', 'hep-ph/9905221'], chunk_size=1)
+        self.assertEqual(len(self.urls), 2)
+        self.assertEqual(resolved.keys(), ['hep-ph/9905221'])
+
+
+if __name__ == '__main__':
+    unittest.main()
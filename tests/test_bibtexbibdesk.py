@@ -0,0 +1,174 @@
+"""
+Tests of the BibTeX reader and writer.
+
+Run from the repository root with::
+
+    python -m unittest discover -s tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import bibtexbibdesk
+
+SOURCE = r"""
+@string{apj = "Astrophysical Journal"}
+
+@comment{ignored @article{not, title = {an entry}} }
+
+@ARTICLE{2012PhLB..716....1A,
+  author = {{ATLAS Collaboration} and Aad, G.},
+  title = "{Observation of a new particle, {with} commas}",
+  journal = apj,
+  month = jul,
+  pages = {1--29},
+  note = "Vol. " # {716} # " of " # apj,
+  year = 2012
+}
+
+@preamble{"\newcommand{\noop}[1]{}"}
+
+@misc(paren, title = {in parentheses})
+
+@book{empty}
+"""
+
+
+class ParseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.entries = bibtexbibdesk.parse(SOURCE)
+
+    def test_entries(self):
+        self.assertEqual([(e.type, e.key) for e in self.entries],
+                         [('ARTICLE', '2012PhLB..716....1A'),
+                          ('misc', 'paren'), ('book', 'empty')])
+
+    def test_raw_values_are_kept(self):
+        entry = self.entries[0]
+        self.assertEqual(entry.fields.keys(),
+                         ['author', 'title', 'journal', 'month', 'pages',
+                          'note', 'year'])
+        self.assertEqual(entry['Title'],
+                         '"{Observation of a new particle, {with} commas}"')
+        self.assertEqual(entry['year'], '2012')
+
+    def test_expanded_values(self):
+        entry = self.entries[0]
+        self.assertEqual(entry.get('author'),
+                         '{ATLAS Collaboration} and Aad, G.')
+        self.assertEqual(entry.get('journal'), 'Astrophysical Journal')
+        self.assertEqual(entry.get('month'), 'July')
+        self.assertEqual(entry.get('note'),
+                         'Vol. 716 of Astrophysical Journal')
+        self.assertEqual(entry.get('missing', ''), '')
+
+    def test_selected_fields(self):
+        entries = bibtexbibdesk.iterparse(SOURCE, fields=['Title', 'year'])
+        self.assertEqual(next(entries).fields.keys(), ['title', 'year'])
+
+    def test_malformed_entry_is_skipped(self):
+        entries = bibtexbibdesk.parse('@article{bad, title = {x} junk}\n'
+                                      '@article{good, title = {y}}')
+        self.assertEqual([e.key for e in entries], ['good'])
+
+    def test_format_round_trip(self):
+        entry = self.entries[0]
+        again = bibtexbibdesk.parse_entry(str(entry))
+        self.assertEqual(again.fields, entry.fields)
+        self.assertRaises(bibtexbibdesk.BibTexException,
+                          bibtexbibdesk.parse_entry, 'no entry')
+
+    def test_expand(self):
+        expand = bibtexbibdesk.expand
+        self.assertEqual(expand('{a {b} c}'), 'a {b} c')
+        self.assertEqual(expand('"a {"} b"'), 'a {"} b')
+        self.assertEqual(expand('x # " y"', {'x': 'X'}), 'X y')
+        self.assertEqual(expand('dec'), 'December')
+
+
+class IterReadTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.bib')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def read(self, text, **kwargs):
+        with open(self.path, 'w') as f:
+            f.write(text)
+        return [(e.key, e.fields.items())
+                for e in bibtexbibdesk.iterread(self.path, **kwargs)]
+
+    def test_same_entries_as_iterparse_for_any_chunk_size(self):
+        expected = [(e.key, e.fields.items())
+                    for e in bibtexbibdesk.iterparse(SOURCE)]
+        for chunk_size in (1, 2, 7, 64, 2 ** 16):
+            self.assertEqual(self.read(SOURCE, chunk_size=chunk_size),
+                             expected, 'chunk size %i' % chunk_size)
+
+    def test_strings_are_shared_across_chunks(self):
+        strings = {}
+        entries = self.read(SOURCE, chunk_size=5, strings=strings)
+        self.assertEqual(strings.get('apj'), 'Astrophysical Journal')
+        self.assertEqual(len(entries), 3)
+
+    def test_unterminated_entry_at_end_of_file(self):
+        entries = self.read('@misc{a, title = {x}}\n@misc{b, title = {y',
+                            chunk_size=4)
+        self.assertEqual([key for key, _ in entries], ['a'])
+
+    def test_unterminated_entry_is_skipped_after_max_entry_size(self):
+        text = ('@misc{a, title = {x}}\n'
+                '@misc{bad, title = {never closed\n' + 'y' * 5000 + '\n'
+                '@misc{c, title = {z}}\n')
+        for chunk_size in (3, 100, 2 ** 16):
+            entries = self.read(text, chunk_size=chunk_size,
+                                max_entry_size=1000)
+            self.assertEqual([key for key, _ in entries], ['a', 'c'],
+                             'chunk size %i' % chunk_size)
+
+
+class BibWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'library.bib')
+        with open(self.path, 'w') as f:
+            f.write('old')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_write(self):
+        strings = dict(bibtexbibdesk.MONTHS, apj='Astrophysical Journal')
+        with bibtexbibdesk.BibWriter(self.path, strings) as writer:
+            for entry in bibtexbibdesk.iterparse(SOURCE):
+                writer.write(entry)
+            self.assertEqual(self.read(), 'old')
+        written = self.read()
+        self.assertTrue(written.startswith(
+            '@string{apj = {Astrophysical Journal}}\n\n'))
+        self.assertEqual([e.key for e in bibtexbibdesk.parse(written)],
+                         ['2012PhLB..716....1A', 'paren', 'empty'])
+
+    def test_error_leaves_the_file_untouched(self):
+        try:
+            with bibtexbibdesk.BibWriter(self.path) as writer:
+                writer.write('@misc{a}')
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(self.read(), 'old')
+        self.assertEqual(os.listdir(self.dir), ['library.bib'])
+
+
+if __name__ == '__main__':
+    unittest.main()
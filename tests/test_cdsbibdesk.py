@@ -0,0 +1,135 @@
+"""
+Tests of the record parsing of cdsbibdesk.
+
+cdsbibdesk needs PyObjC (AppKit), so these tests are skipped without it.
+Run from the repository root with::
+
+    python -m unittest discover -s tests
+"""
+import json
+import unittest
+import urllib2
+from xml.etree import ElementTree
+
+try:
+    import AppKit
+except ImportError:
+    AppKit = None
+
+if AppKit is not None:
+    import cdsbibdesk
+
+needs_appkit = unittest.skipIf(AppKit is None, 'PyObjC is not installed')
+
+METADATA = {
+    'control_number': 1124337,
+    'arxiv_eprints': [{'value': '1207.7214'}],
+    'authors': [{'full_name': 'Aad, Georges'}],
+    'publication_info': [{'journal_title': 'Phys.Lett.B',
+                          'journal_volume': '716', 'year': 2012,
+                          'page_start': '1', 'page_end': '29'}],
+    'dois': [{'value': '10.1016/j.physletb.2012.08.020'}],
+    'titles': [{'title': 'Observation of a new particle'}],
+    'abstracts': [{'value': 'A search for the Higgs boson'}],
+}
+
+
+@needs_appkit
+class InspireParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fetch = cdsbibdesk.httpbibdesk.fetch
+
+    def tearDown(self):
+        cdsbibdesk.httpbibdesk.fetch = self.fetch
+
+    def fail_with(self, code):
+        def fetch(url, headers=None):
+            raise urllib2.HTTPError(url, code, 'error', {}, None)
+        cdsbibdesk.httpbibdesk.fetch = fetch
+
+    def test_missing_record(self):
+        self.fail_with(404)
+        self.assertRaises(cdsbibdesk.InspireNotFound,
+                          cdsbibdesk.InspireParser().parse_at_id, '1')
+
+    def test_other_http_errors_are_not_missing_records(self):
+        for code in (403, 429, 500, 503):
+            self.fail_with(code)
+            try:
+                cdsbibdesk.InspireParser().parse_at_id('1')
+            except cdsbibdesk.InspireNotFound:
+                self.fail('HTTP %i taken for a missing record' % code)
+            except cdsbibdesk.InspireException:
+                pass
+            else:
+                self.fail('HTTP %i not raised' % code)
+
+    def test_bad_json(self):
+        cdsbibdesk.httpbibdesk.fetch = lambda url, headers=None: '<html>'
+        self.assertRaises(cdsbibdesk.InspireException,
+                          cdsbibdesk.InspireParser().parse_at_id, '1')
+
+    def test_no_hits_for_doi(self):
+        cdsbibdesk.httpbibdesk.fetch = \
+            lambda url, headers=None: json.dumps({'hits': {'hits': []}})
+        self.assertRaises(cdsbibdesk.InspireNotFound,
+                          cdsbibdesk.InspireParser().parse_at_doi, '10.1/x')
+
+    def test_parse_record(self):
+        parser = cdsbibdesk.InspireParser()
+        parser.parse_record(METADATA)
+        bib = parser.bib
+        self.assertEqual(parser.recid, '1124337')
+        self.assertEqual(bib.Eprint, 'arXiv:1207.7214')
+        self.assertEqual(bib.Author, '{Aad},  Georges')
+        self.assertEqual(bib.Pages, '1-29')
+        self.assertEqual(bib.Title, 'Observation of a new particle')
+        self.assertEqual(bib.Abstract, 'A search for the Higgs boson')
+        self.assertEqual(bib.info['link'], 'https://arxiv.org/pdf/1207.7214')
+
+    def test_record_without_title_or_abstract(self):
+        parser = cdsbibdesk.InspireParser()
+        parser.parse_record({'control_number': 1, 'abstracts': [{}]})
+        self.assertEqual((parser.bib.Title, parser.bib.Abstract), ('', ''))
+        self.assertEqual(parser.bib.Eprint, '1')
+        self.assertEqual(parser.bib.info['link'], '')
+
+
+MARC = """<record xmlns="http://www.loc.gov/MARC21/slim">
+  <controlfield tag="001">2231061</controlfield>
+  <datafield tag="037" ind1=" " ind2=" ">
+    <subfield code="a">cms-pas-hig-16-027</subfield>
+  </datafield>
+  <datafield tag="100" ind1=" " ind2=" ">
+    <subfield code="a">CMS Collaboration</subfield>
+  </datafield>
+  %s
+</record>"""
+
+
+@needs_appkit
+class MarcRecordTest(unittest.TestCase):
+
+    def test_fields(self):
+        xml = ElementTree.fromstring(MARC % """
+  <datafield tag="245" ind1=" " ind2=" ">
+    <subfield code="a">Search for ttH</subfield>
+  </datafield>
+  <datafield tag="520" ind1=" " ind2=" ">
+    <subfield code="a">An abstract</subfield>
+  </datafield>""")
+        self.assertEqual(cdsbibdesk.find_title_in_xml(xml), 'Search for ttH')
+        self.assertEqual(cdsbibdesk.find_abstract_in_xml(xml), 'An abstract')
+        self.assertEqual(cdsbibdesk.find_report_numbers_in_xml(xml),
+                         ['CMS-PAS-HIG-16-027'])
+
+    def test_record_without_title_or_abstract(self):
+        record = cdsbibdesk.marc_record(ElementTree.fromstring(MARC % ''))
+        self.assertEqual(cdsbibdesk.find_title_in_xml(record), '')
+        self.assertEqual(cdsbibdesk.find_abstract_in_xml(record), '')
+        self.assertEqual(record.controlfield('001'), '2231061')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+"""
+Tests of httpbibdesk that need neither network access nor AppKit.
+
+Run from the repository root with::
+
+    python -m unittest discover -s tests
+"""
+import BaseHTTPServer
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib2
+from StringIO import StringIO
+
+import httpbibdesk
+
+
+class FakeResponse(StringIO):
+    """Response of `FakeOpener`, with the attributes the cache reads"""
+
+    def __init__(self, body, code=200, headers=None):
+        StringIO.__init__(self, body)
+        self.code = code
+        self.headers = headers or {}
+
+    def geturl(self):
+        return ''
+
+    def info(self):
+        return self.headers
+
+
+class FakeOpener(object):
+    """`urlopen`-like callable serving `body`, recording the request
+    headers"""
+
+    def __init__(self, body, etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    def __call__(self, url, headers=None):
+        self.requests.append(dict(headers or {}))
+        if self.etag and (headers or {}).get('If-None-Match') == self.etag:
+            return FakeResponse('', 304)
+        return FakeResponse(self.body, headers={'etag': self.etag})
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = httpbibdesk.ResponseCache(self.path, ttl=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_fresh_entry_is_served_without_request(self):
+        opener = FakeOpener('body')
+        self.assertEqual(self.cache.fetch(opener, 'http://h/a'), 'body')
+        self.assertEqual(self.cache.fetch(opener, 'http://h/a'), 'body')
+        self.assertEqual(len(opener.requests), 1)
+
+    def test_stale_entry_is_revalidated(self):
+        opener = FakeOpener('body')
+        self.cache.fetch(opener, 'http://h/a')
+        self.cache.ttl = 0
+        self.assertEqual(self.cache.fetch(opener, 'http://h/a'), 'body')
+        self.assertEqual(opener.requests[-1].get('If-None-Match'), '"v1"')
+
+    def test_accept_header_is_part_of_the_key(self):
+        opener = FakeOpener('body')
+        self.cache.fetch(opener, 'http://h/a')
+        self.cache.fetch(opener, 'http://h/a', {'Accept': 'application/json'})
+        self.assertEqual(len(opener.requests), 2)
+
+    def test_body_closed_early_is_not_cached(self):
+        opener = FakeOpener('x' * 100)
+        stream = self.cache.open(opener, 'http://h/a')
+        stream.read(10)
+        stream.close()
+        self.cache.fetch(opener, 'http://h/a')
+        self.assertEqual(len(opener.requests), 2)
+
+    def test_body_read_in_chunks_is_cached(self):
+        opener = FakeOpener('x' * 100)
+        stream = self.cache.open(opener, 'http://h/a')
+        while stream.read(30):
+            pass
+        stream.close()
+        self.assertEqual(self.cache.fetch(opener, 'http://h/a'), 'x' * 100)
+        self.assertEqual(len(opener.requests), 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.max_size = 250
+        opener = FakeOpener('x' * 100)
+        for age, name in ((20, 'a'), (10, 'b')):
+            self.cache.fetch(opener, 'http://h/' + name)
+            body = os.path.join(self.path,
+                                self.cache._key('http://h/' + name, {}))
+            os.utime(body + '.body', (time.time() - age,) * 2)
+        self.cache.fetch(opener, 'http://h/c')
+        bodies = sorted(name[:-5] for name in os.listdir(self.path)
+                        if name.endswith('.body'))
+        self.assertEqual(bodies, sorted(self.cache._key('http://h/' + name,
+                                                        {})
+                                        for name in 'bc'))
+
+
+class RateLimitTest(unittest.TestCase):
+
+    def test_burst_then_wait(self):
+        bucket = httpbibdesk.TokenBucket(rate=20, burst=2)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertAlmostEqual(bucket.acquire(), .05, delta=.02)
+
+    def test_unlimited_host(self):
+        limiter = httpbibdesk.RateLimiter(0, 1)
+        self.assertEqual([limiter.wait('h') for _ in range(5)], [0] * 5)
+
+    def test_host_override(self):
+        limiter = httpbibdesk.RateLimiter(0, 1, {'slow.org': (20, 1)})
+        limiter.wait('Slow.org')
+        self.assertGreater(limiter.wait('slow.org'), 0)
+        self.assertEqual(limiter.wait('fast.org'), 0)
+
+    def test_parse_host_rates(self):
+        self.assertEqual(
+            httpbibdesk.parse_host_rates('Export.arxiv.org:0.5:1, a.org:2:3,'),
+            {'export.arxiv.org': (.5, 1.), 'a.org': (2., 3.)})
+        self.assertEqual(httpbibdesk.parse_host_rates(None), {})
+
+    def test_parse_host_rates_skips_malformed_entries(self):
+        self.assertEqual(
+            httpbibdesk.parse_host_rates('bad, x:y:z, :1, a.org:2:3'),
+            {'a.org': (2., 3.)})
+
+
+class RangeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves `body` with byte ranges, dropping the connection after `cut`
+    bytes of the first `drops` responses"""
+
+    body = '%PDF-1.4\n' + 'x' * 200000
+    cut = 50000
+    drops = 0
+    ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cls = RangeHandler
+        header = self.headers.get('Range')
+        cls.ranges.append(header)
+        start = int(re.match(r'bytes=(\d+)-', header).group(1)) \
+            if header else 0
+        if start >= len(self.body):
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */%i' % len(self.body))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        part = self.body[start:]
+        if header:
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %i-%i/%i'
+                             % (start, len(self.body) - 1, len(self.body)))
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(part)))
+        self.end_headers()
+        if cls.drops:
+            cls.drops -= 1
+            part = part[:self.cut]
+            self.close_connection = 1
+        self.wfile.write(part)
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        RangeHandler.ranges = []
+        RangeHandler.drops = 0
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                RangeHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%i/paper.pdf' % self.server.server_port
+        self.dir = tempfile.mkdtemp()
+        self.cache = httpbibdesk.cache
+        httpbibdesk.cache = httpbibdesk.ResponseCache(self.dir)
+        self.path = os.path.join(self.dir, 'paper.pdf')
+
+    def tearDown(self):
+        httpbibdesk.cache = self.cache
+        self.server.shutdown()
+        self.server.server_close()
+        httpbibdesk.pool.clear()
+        shutil.rmtree(self.dir)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_interrupted_download_is_resumed(self):
+        RangeHandler.drops = 2
+        self.assertTrue(httpbibdesk.download(self.url, self.path,
+                                             backoff=0))
+        self.assertEqual(self.read(), RangeHandler.body)
+        self.assertEqual(RangeHandler.ranges,
+                         [None, 'bytes=50000-', 'bytes=100000-'])
+
+    def test_partial_download_is_kept_for_the_next_call(self):
+        RangeHandler.drops = 2
+        self.assertRaises(urllib2.URLError, httpbibdesk.download,
+                          self.url, self.path, retries=1, backoff=0)
+        partial = httpbibdesk.partial_path(self.url)
+        self.assertEqual(os.path.getsize(partial), 100000)
+        self.assertTrue(httpbibdesk.download(self.url, self.path))
+        self.assertEqual(self.read(), RangeHandler.body)
+        self.assertEqual(RangeHandler.ranges[-1], 'bytes=100000-')
+        self.assertFalse(os.path.exists(partial))
+        self.assertFalse(os.path.exists(partial + '.journal'))
+
+    def test_complete_partial_is_moved_into_place_on_416(self):
+        partial = httpbibdesk.partial_path(self.url)
+        with open(partial, 'wb') as f:
+            f.write(RangeHandler.body)
+        with open(partial + '.journal', 'w') as f:
+            json.dump({'url': self.url, 'size': len(RangeHandler.body)}, f)
+        self.assertTrue(httpbibdesk.download(self.url, self.path))
+        self.assertEqual(self.read(), RangeHandler.body)
+        self.assertEqual(RangeHandler.ranges,
+                         ['bytes=%i-' % len(RangeHandler.body)])
+
+    def test_concurrent_downloads_of_the_same_url(self):
+        paths = [self.path + str(i) for i in range(3)]
+        threads = [threading.Thread(target=httpbibdesk.download,
+                                    args=(self.url, path))
+                   for path in paths]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for path in paths:
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), RangeHandler.body)
+
+    def test_not_a_pdf(self):
+        RangeHandler.body, body = 'x' * 200000, RangeHandler.body
+        try:
+            self.assertFalse(httpbibdesk.download(self.url, self.path,
+                                                  sniff_size=1024))
+        finally:
+            RangeHandler.body = body
+        self.assertLess(os.path.getsize(self.path), 200000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests of article identifier recognition and canonical keys.
+
+Run from the repository root with::
+
+    python -m unittest discover -s tests
+"""
+import unittest
+
+import identbibdesk
+
+
+class ParseTest(unittest.TestCase):
+
+    def assertKey(self, token, expected):
+        self.assertEqual(identbibdesk.key(token), expected, token)
+
+    def test_arxiv_spellings(self):
+        for token in ('1207.7214', 'arXiv:1207.7214v2', ' 1207.7214v1 ',
+                      'https://arxiv.org/abs/1207.7214',
+                      'http://export.arxiv.org/pdf/1207.7214v2.pdf'):
+            self.assertKey(token, 'arxiv:1207.7214')
+
+    def test_old_style_arxiv(self):
+        for token in ('math.GT/0309136v1', 'arXiv:math/0309136',
+                      'http://arxiv.org/abs/math.GT/0309136',
+                      'MATH/0309136'):
+            self.assertKey(token, 'arxiv:math/0309136')
+        self.assertKey('hep-ph/9905221', 'arxiv:hep-ph/9905221')
+
+    def test_version(self):
+        ident = identbibdesk.parse('math.GT/0309136v2')
+        self.assertEqual((ident.id, ident.version, ident.versioned),
+                         ('math/0309136', 'v2', 'math/0309136v2'))
+        self.assertEqual(identbibdesk.parse('1207.7214').version, '')
+        self.assertEqual(ident, identbibdesk.parse('math/0309136'))
+
+    def test_other_kinds(self):
+        self.assertKey('doi:10.1016/J.PHYSLETB.2012.08.020',
+                       'doi:10.1016/j.physletb.2012.08.020')
+        self.assertKey('https://doi.org/10.1016/j.physletb.2012.08.020',
+                       'doi:10.1016/j.physletb.2012.08.020')
+        self.assertKey('2012PhLB..716....1A', 'bibcode:2012PhLB..716....1A')
+        self.assertKey('cms-pas-hig-16-027', 'report:CMS-PAS-HIG-16-027')
+        self.assertKey('0001124', 'recid:1124')
+
+    def test_unrecognised(self):
+        self.assertIsNone(identbibdesk.parse('Higgs boson'))
+        self.assertEqual(identbibdesk.classify(' foo '), (None, 'foo'))
+        self.assertKey(' Higgs ', 'higgs')
+
+
+class FindTest(unittest.TestCase):
+
+    def test_find_arxiv_ids(self):
+        text = 'see arXiv:1207.7214v2 and hep-ph/9905221, not 12345.678/9'
+        self.assertEqual(identbibdesk.find_arxiv_ids(text),
+                         ['1207.7214v2', 'hep-ph/9905221'])
+        self.assertEqual(identbibdesk.find_arxiv_ids(text, prefixed=True),
+                         ['1207.7214v2'])
+
+    def test_find_dois_without_trailing_punctuation(self):
+        text = ('(doi:10.1016/j.physletb.2012.08.020). '
+                'Also 10.1103/PhysRevLett.114.191803, and '
+                '"10.1016/j.physletb.2012.08.020";')
+        self.assertEqual(sorted(identbibdesk.find_dois(text)),
+                         ['10.1016/j.physletb.2012.08.020',
+                          '10.1103/PhysRevLett.114.191803'])
+
+
+class RecordKeysTest(unittest.TestCase):
+
+    def test_ads_record(self):
+        self.assertEqual(identbibdesk.record_keys(
+            doi='10.1016/J.PHYSLETB.2012.08.020', eprint='1207.7214',
+            adsurl='http://adsabs.harvard.edu/abs/2012PhLB..716....1A'),
+            set(['doi:10.1016/j.physletb.2012.08.020', 'arxiv:1207.7214',
+                 'bibcode:2012PhLB..716....1A']))
+
+    def test_inspire_record(self):
+        # the recid in Eprint is ignored, the one of the Url is kept
+        self.assertEqual(identbibdesk.record_keys(
+            eprint='1124337', url='https://inspirehep.net/record/01124337'),
+            set(['recid:1124337']))
+        self.assertEqual(identbibdesk.record_keys(
+            eprint='CMS-PAS-HIG-16-027',
+            adsurl='http://inspirehep.net/literature/1124337'),
+            set(['report:CMS-PAS-HIG-16-027', 'recid:1124337']))
+
+    def test_arxiv_abstract_page(self):
+        self.assertEqual(identbibdesk.record_keys(
+            adsurl='http://arxiv.org/abs/math.GT/0309136v1'),
+            set(['arxiv:math/0309136']))
+
+    def test_nothing(self):
+        self.assertEqual(identbibdesk.record_keys(), set())
+
+
+if __name__ == '__main__':
+    unittest.main()